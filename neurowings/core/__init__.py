@@ -9,7 +9,9 @@ NeuroWings Core - Ядро приложения
 from .models import (
     TORCH_AVAILABLE, TORCH_IMPORT_ERROR,
     TORCHVISION_MODELS_AVAILABLE, TORCHVISION_MODELS_IMPORT_ERROR,
-    get_device, load_stage2_model, load_stage2_portable_model, load_subpixel_model
+    ORT_AVAILABLE, ORT_IMPORT_ERROR, TENSORRT_AVAILABLE,
+    get_device, load_stage2_model, load_stage2_portable_model, load_subpixel_model,
+    load_onnx_model, load_yolo_model
 )
 
 from .constants import (
@@ -20,7 +22,7 @@ from .constants import (
     COLOR_YOLO, COLOR_STAGE1, COLOR_STAGE2, COLOR_GT,
     DEFAULT_POINT_RADIUS, DEFAULT_TEXT_SIZE,
     BREEDS, INDEX_POINTS, YOLO_TO_WINGSDIG,
-    STAGE2_PORTABLE_CROP_SIZE, STAGE2_PORTABLE_CROP_HALF,
+    STAGE2_CROP_SIZE, STAGE2_PORTABLE_CROP_SIZE, STAGE2_PORTABLE_CROP_HALF,
     STAGE2_PORTABLE_ITERATIONS, STAGE2_PORTABLE_MAX_OFFSET
 )
 
@@ -37,7 +39,9 @@ __all__ = [
     # models (torch first)
     'TORCH_AVAILABLE', 'TORCH_IMPORT_ERROR',
     'TORCHVISION_MODELS_AVAILABLE', 'TORCHVISION_MODELS_IMPORT_ERROR',
+    'ORT_AVAILABLE', 'ORT_IMPORT_ERROR', 'TENSORRT_AVAILABLE',
     'get_device', 'load_stage2_model', 'load_stage2_portable_model', 'load_subpixel_model',
+    'load_onnx_model', 'load_yolo_model',
     # constants
     'APP_NAME', 'APP_VERSION', 'APP_AUTHOR', 'APP_MAX_URL', 'APP_TELEGRAM_LABEL', 'APP_TELEGRAM_URL',
     'APP_UPDATE_FEED_URL', 'NUM_POINTS',
@@ -46,7 +50,7 @@ __all__ = [
     'COLOR_YOLO', 'COLOR_STAGE1', 'COLOR_STAGE2', 'COLOR_GT',
     'DEFAULT_POINT_RADIUS', 'DEFAULT_TEXT_SIZE',
     'BREEDS', 'INDEX_POINTS', 'YOLO_TO_WINGSDIG',
-    'STAGE2_PORTABLE_CROP_SIZE', 'STAGE2_PORTABLE_CROP_HALF',
+    'STAGE2_CROP_SIZE', 'STAGE2_PORTABLE_CROP_SIZE', 'STAGE2_PORTABLE_CROP_HALF',
     'STAGE2_PORTABLE_ITERATIONS', 'STAGE2_PORTABLE_MAX_OFFSET',
     # calculations
     'calculate_ci', 'calculate_dsa', 'calculate_hi',
@@ -111,8 +111,17 @@ def calculate_indices(points: List[Point]) -> Dict[str, float]:
     HI = dist(P5,P7) / dist(P3,P4)
     DsA = calculate_dsa_excel
     """
+    indices, _ = calculate_indices_and_projection(points)
+    return indices
+
+
+def calculate_indices_and_projection(points: List[Point]) -> Tuple[Dict[str, float], Point]:
+    """
+    calculate_indices() + проекция из calculate_dsa_excel(): DsA считается один раз.
+    Используется в Wing.analyze() (вызывается при каждой правке точек).
+    """
     if not isinstance(points, (list, tuple)) or len(points) != 8:
-        return {"CI": 0.0, "DsA": 0.0, "HI": 0.0}
+        return {"CI": 0.0, "DsA": 0.0, "HI": 0.0}, (0.0, 0.0)
 
     p1, p2, p3, p4, p5, p6, p7, p8 = points
 
@@ -124,9 +133,9 @@ def calculate_indices(points: List[Point]) -> Dict[str, float]:
     d34 = dist(p3, p4)
     hi = d57 / d34 if d34 > 1e-12 else 0.0
 
-    dsa, _ = calculate_dsa_excel(points)
+    dsa, proj = calculate_dsa_excel(points)
 
-    return {"CI": float(ci), "DsA": float(dsa), "HI": float(hi)}
+    return {"CI": float(ci), "DsA": float(dsa), "HI": float(hi)}, proj
 
 
 def identify_breed(CI: float, DsA: float, HI: float):
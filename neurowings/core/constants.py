@@ -75,10 +75,12 @@ BREED_RANGES = BREEDS
 # YOLO Detection настройки
 YOLO_DET_IMAGE_SIZE = 1280
 YOLO_DET_CONFIDENCE = 0.5
+YOLO_DET_BATCH_SIZE = 8  # Изображений за один вызов детектора
 
 # YOLO Pose настройки
 YOLO_POSE_IMAGE_SIZE = 768
 YOLO_POSE_CONFIDENCE = 0.25
+YOLO_POSE_BATCH_SIZE = 16  # Кропов за один вызов позы (и наибольший батч TensorRT-движка)
 
 # Stage2 (ResNet) настройки - НОВАЯ ЛОГИКА 2025
 # Модель выдаёт прямое смещение в пикселях (не нормализованное)
@@ -92,6 +94,8 @@ STAGE2_PORTABLE_CROP_SIZE = 256
 STAGE2_PORTABLE_CROP_HALF = 128
 STAGE2_PORTABLE_ITERATIONS = 2
 STAGE2_PORTABLE_MAX_OFFSET = 30  # пикселей за итерацию
+# Окно кропа ровно 2*HALF: патч после copyMakeBorder уже нужного размера, resize не нужен
+assert STAGE2_PORTABLE_CROP_SIZE == 2 * STAGE2_PORTABLE_CROP_HALF
 
 # Отступы для bbox
 BBOX_MARGIN = 20  # Отступ от границ bbox (пикселей)
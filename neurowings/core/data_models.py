@@ -9,7 +9,9 @@ from typing import List, Optional, Tuple, Dict
 from pathlib import Path
 from enum import Enum
 
-from .calculations import calculate_indices, identify_breed, get_problem_points, calculate_dsa_excel
+import numpy as np
+
+from .calculations import calculate_indices_and_projection, identify_breed, get_problem_points
 
 
 @dataclass
@@ -53,21 +55,39 @@ class Wing:
     points_stage2: List[WingPoint] = field(default_factory=list)
     # Выбранная модель для каждой точки: 'yolo', 'stage1', 'stage2'
     point_sources: List[str] = field(default_factory=lambda: ['stage2'] * 8)
+    # Кэши производных значений, сбрасываются в analyze()
+    _center_cache: Optional[Tuple[float, float]] = field(default=None, init=False, repr=False, compare=False)
+    _active_points_cache: Optional[List[Tuple[float, float]]] = field(default=None, init=False, repr=False, compare=False)
+    _points_xy_cache: Optional[np.ndarray] = field(default=None, init=False, repr=False, compare=False)
     
     def get_center(self) -> Tuple[float, float]:
         """Получить центр крыла"""
+        if self._center_cache is not None:
+            return self._center_cache
         if not self.points:
-            return (0, 0)
-        cx = sum(p.x for p in self.points) / len(self.points)
-        cy = sum(p.y for p in self.points) / len(self.points)
-        return (cx, cy)
+            center = (0, 0)
+        else:
+            cx = sum(p.x for p in self.points) / len(self.points)
+            cy = sum(p.y for p in self.points) / len(self.points)
+            center = (cx, cy)
+        self._center_cache = center
+        return center
     
     def get_points_tuple(self) -> List[Tuple[float, float]]:
         """Получить точки как список кортежей"""
         return [(p.x, p.y) for p in self.points]
+
+    @property
+    def points_xy(self) -> np.ndarray:
+        """Координаты points как непрерывный массив (N, 2) float64 (синхронизируется в analyze)"""
+        if self._points_xy_cache is None:
+            self._points_xy_cache = np.array(self.get_points_tuple(), dtype=np.float64).reshape(-1, 2)
+        return self._points_xy_cache
     
     def get_active_points(self) -> List[Tuple[float, float]]:
         """Получить координаты точек согласно выбранным источникам"""
+        if self._active_points_cache is not None:
+            return self._active_points_cache
         result = []
         for i in range(min(8, len(self.points))):
             source = self.point_sources[i] if i < len(self.point_sources) else 'stage2'
@@ -81,6 +101,7 @@ class Wing:
                 result.append((self.points[i].x, self.points[i].y))
             else:
                 result.append((0, 0))
+        self._active_points_cache = result
         return result
     
     def analyze(self, image_height: Optional[int] = None):
@@ -91,6 +112,10 @@ class Wing:
             image_height: Высота изображения для преобразования координат из экранной системы (Y сверху)
                          в систему WingsDig (Y снизу). Если None, используются координаты как есть.
         """
+        # Точки или источники могли измениться - сбрасываем кэши
+        self._center_cache = None
+        self._active_points_cache = None
+        self._points_xy_cache = None
         points = self.get_active_points()
         if len(points) != 8:
             self.analysis = WingAnalysis()
@@ -103,10 +128,9 @@ class Wing:
             points_wingsdig = [(px, image_height - py) for px, py in points]
             points = points_wingsdig
         
-        indices = calculate_indices(points)
+        indices, projection = calculate_indices_and_projection(points)
         breeds, index_valid = identify_breed(indices['CI'], indices['DsA'], indices['HI'])
         problem_points = get_problem_points(index_valid)
-        _, projection = calculate_dsa_excel(points)
         
         self.analysis = WingAnalysis(
             CI=indices['CI'],
@@ -130,6 +154,8 @@ class ImageData:
     is_processed: bool = False
     is_modified: bool = False
     analysis_results: Dict = field(default_factory=dict)
+    # Крылья уже упорядочены по рядам; сбрасывается при изменении состава/геометрии
+    _wings_sorted: bool = field(default=False, init=False, repr=False, compare=False)
     
     def analyze_all_wings(self):
         """Анализировать все крылья"""
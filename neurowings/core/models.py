@@ -5,13 +5,18 @@ NeuroWings - Нейросетевые модели
 Обновлено для models_trained_2025_01_19
 """
 
+import importlib.util
 import logging
+from pathlib import Path
+
+import numpy as np
 
 logger = logging.getLogger("NeuroWings")
 
 TORCH_IMPORT_ERROR = None
 TORCHVISION_MODELS_AVAILABLE = False
 TORCHVISION_MODELS_IMPORT_ERROR = None
+ORT_IMPORT_ERROR = None
 
 try:
     import torch
@@ -33,6 +38,18 @@ if TORCH_AVAILABLE:
             "Stage2/SubPixel-модели будут отключены, базовая обработка останется доступной."
         )
 
+# ONNX Runtime - опционально, ускоряет Stage2 если установлен
+try:
+    import onnxruntime as ort
+    ORT_AVAILABLE = True
+except ImportError as e:
+    ORT_AVAILABLE = False
+    ORT_IMPORT_ERROR = str(e)
+
+# TensorRT - опционально, для FP16-движков YOLO (.engine). Только проверка наличия:
+# сам пакет импортирует Ultralytics при экспорте/загрузке движка
+TENSORRT_AVAILABLE = importlib.util.find_spec("tensorrt") is not None
+
 
 class Stage2Model(nn.Module):
     """
@@ -256,3 +273,193 @@ def load_stage2_portable_model(model_path: str, device):
     except Exception as e:
         logger.error(f"Ошибка загрузки Stage2 portable: {e}", exc_info=True)
         return None
+
+
+# -----------------------------------------------------------------------------
+# ONNX Runtime (опционально)
+# -----------------------------------------------------------------------------
+class OnnxModel:
+    """
+    Обёртка над onnxruntime.InferenceSession с интерфейсом модели PyTorch:
+    принимает NCHW тензор и возвращает тензор (N, 2) на том же устройстве.
+    На CUDA вход и выход привязываются к памяти тензоров (IO binding), без копий через хост.
+    """
+
+    def __init__(self, session, device):
+        self.session = session
+        self.device = device
+        self.input_name = session.get_inputs()[0].name
+        self.output_name = session.get_outputs()[0].name
+        self.use_io_binding = (
+            getattr(device, 'type', None) == 'cuda'
+            and session.get_providers()[0] != 'CPUExecutionProvider'
+        )
+
+    def __call__(self, x):
+        x = x.float().contiguous()
+        if not self.use_io_binding:
+            out = self.session.run([self.output_name], {self.input_name: x.cpu().numpy()})[0]
+            return torch.from_numpy(out).to(x.device)
+
+        out = torch.empty((x.shape[0], 2), dtype=torch.float32, device=x.device)
+        device_id = x.device.index or 0
+        binding = self.session.io_binding()
+        binding.bind_input(self.input_name, 'cuda', device_id, np.float32, tuple(x.shape), x.data_ptr())
+        binding.bind_output(self.output_name, 'cuda', device_id, np.float32, tuple(out.shape), out.data_ptr())
+        # ORT работает в своём CUDA-потоке: вход должен быть готов до запуска
+        torch.cuda.current_stream(x.device).synchronize()
+        self.session.run_with_iobinding(binding)
+        return out
+
+
+# Наибольший батч моделей уточнения за один вызов. Общий предел для профиля TensorRT,
+# бакетов CUDA Graph и разбиения батча в ProcessingWorker (больше - по частям)
+REFINE_MAX_BATCH = 128
+# Профиль форм TensorRT: батч от 1 до REFINE_MAX_BATCH (оптимум - TRT_OPT_BATCH)
+TRT_OPT_BATCH = REFINE_MAX_BATCH // 2
+
+
+def _ort_providers(device, onnx_path, crop_size: int):
+    """
+    Список провайдеров ONNX Runtime для устройства (только доступные).
+    На CUDA первым идёт TensorRT (FP16, движок кэшируется рядом с моделью),
+    затем CUDA и CPU как запасные.
+    """
+    available = set(ort.get_available_providers())
+    providers = []
+    if getattr(device, 'type', None) == 'cuda':
+        device_id = device.index or 0
+        if 'TensorrtExecutionProvider' in available:
+            shape = f"3x{crop_size}x{crop_size}"
+            providers.append(('TensorrtExecutionProvider', {
+                'device_id': device_id,
+                'trt_fp16_enable': True,
+                'trt_engine_cache_enable': True,
+                'trt_engine_cache_path': str(Path(onnx_path).parent / 'trt_cache'),
+                'trt_profile_min_shapes': f"x:1x{shape}",
+                'trt_profile_opt_shapes': f"x:{TRT_OPT_BATCH}x{shape}",
+                'trt_profile_max_shapes': f"x:{REFINE_MAX_BATCH}x{shape}",
+            }))
+        if 'CUDAExecutionProvider' in available:
+            providers.append(('CUDAExecutionProvider', {'device_id': device_id}))
+    providers.append('CPUExecutionProvider')
+    return providers
+
+
+def export_onnx_model(model, onnx_path, crop_size: int, device):
+    """
+    Экспортировать модель уточнения в ONNX с динамическим размером батча.
+
+    Args:
+        model: Stage2Model / Stage2PortableModel
+        onnx_path: Куда сохранить .onnx
+        crop_size: Размер входного патча
+        device: torch.device
+    """
+    dummy = torch.zeros((1, 3, crop_size, crop_size), dtype=torch.float32, device=device)
+    model.eval()
+    with torch.no_grad():
+        torch.onnx.export(
+            model, dummy, str(onnx_path),
+            opset_version=17,
+            input_names=['x'], output_names=['y'],
+            dynamic_axes={'x': {0: 'n'}, 'y': {0: 'n'}},
+        )
+
+
+def load_onnx_model(model, model_path: str, crop_size: int, device):
+    """
+    Заменить модель PyTorch на сессию ONNX Runtime, если onnxruntime установлен.
+    ONNX-файл лежит рядом с весами (<имя>.onnx) и (пере)экспортируется,
+    если его нет или веса новее.
+
+    На GPU (CUDA/MPS) сессия используется только с активным TensorRT: иначе
+    PyTorch-путь с autocast FP16 и CUDA Graphs быстрее, а CPU-провайдер
+    гонял бы каждый батч через хост.
+
+    Args:
+        model: Загруженная модель PyTorch (или None)
+        model_path: Путь к .pth файлу
+        crop_size: Размер входного патча
+        device: torch.device
+
+    Returns:
+        OnnxModel или исходная модель, если ONNX Runtime недоступен или произошла ошибка
+    """
+    if model is None or not ORT_AVAILABLE:
+        return model
+    on_gpu = getattr(device, 'type', 'cpu') != 'cpu'
+    if on_gpu and 'TensorrtExecutionProvider' not in ort.get_available_providers():
+        return model
+
+    weights_path = Path(model_path)
+    onnx_path = weights_path.with_suffix('.onnx')
+    try:
+        if not onnx_path.exists() or onnx_path.stat().st_mtime < weights_path.stat().st_mtime:
+            export_onnx_model(model, onnx_path, crop_size, device)
+            logger.info(f"Модель экспортирована в ONNX: {onnx_path}")
+
+        session = ort.InferenceSession(str(onnx_path), providers=_ort_providers(device, onnx_path, crop_size))
+        providers = session.get_providers()
+        logger.info(f"ONNX Runtime для {onnx_path.name}: {', '.join(providers)}")
+        # TensorRT мог не подняться (ORT молча откатывается на CUDA/CPU) - тогда остаёмся на PyTorch
+        if on_gpu and providers[0] != 'TensorrtExecutionProvider':
+            logger.info(f"TensorRT для {onnx_path.name} не активен, используется PyTorch")
+            return model
+        return OnnxModel(session, device)
+    except Exception as e:
+        logger.warning(f"ONNX Runtime недоступен для {onnx_path.name}: {e}. Используется PyTorch.")
+        return model
+
+
+# -----------------------------------------------------------------------------
+# YOLO (Ultralytics): FP16-движок TensorRT рядом с весами
+# -----------------------------------------------------------------------------
+def load_yolo_model(model_path: str, task: str, image_size: int, max_batch: int, device,
+                    build_engine: bool = False):
+    """
+    Загрузить модель YOLO. На CUDA предпочитается TensorRT-движок <имя>.engine
+    рядом с весами, если он не старше весов. Сборка движка занимает минуты,
+    поэтому выполняется только по запросу (build_engine) и при установленном TensorRT.
+
+    Args:
+        model_path: Путь к .pt файлу
+        task: Задача модели ('detect' / 'pose'); по имени .engine Ultralytics её не угадает
+        image_size: imgsz, с которым модель вызывается при обработке
+        max_batch: Наибольший батч движка (динамический батч 1..max_batch)
+        device: torch.device
+        build_engine: (Пере)собрать движок, если его нет или веса новее
+
+    Returns:
+        ultralytics.YOLO (движок, уже загруженный пробным кадром, или исходные веса)
+    """
+    from ultralytics import YOLO
+
+    weights_path = Path(model_path)
+    engine_path = weights_path.with_suffix('.engine')
+    if getattr(device, 'type', None) != 'cuda':
+        return YOLO(str(weights_path), task=task)
+
+    try:
+        engine_fresh = engine_path.exists() and engine_path.stat().st_mtime >= weights_path.stat().st_mtime
+        if not engine_fresh and build_engine and TENSORRT_AVAILABLE:
+            model = YOLO(str(weights_path), task=task)
+            engine_path = Path(model.export(
+                format='engine', half=True, dynamic=True, batch=max_batch,
+                imgsz=image_size, device=device.index or 0,
+            ))
+            logger.info(f"Собран TensorRT-движок: {engine_path}")
+            engine_fresh = True
+        if engine_fresh:
+            logger.info(f"Загрузка TensorRT-движка: {engine_path}")
+            engine_model = YOLO(str(engine_path), task=task)
+            # Ultralytics десериализует движок только при первом predict: прогоняем пустой кадр
+            # здесь, чтобы устаревший/несовместимый движок (другая версия TensorRT, драйвер,
+            # GPU, битый файл) откатывался на .pt, а не ронял каждую обработку
+            engine_model.predict(
+                np.zeros((image_size, image_size, 3), dtype=np.uint8), imgsz=image_size, verbose=False
+            )
+            return engine_model
+    except Exception as e:
+        logger.warning(f"TensorRT-движок недоступен для {weights_path.name}: {e}. Используются веса .pt.")
+    return YOLO(str(weights_path), task=task)
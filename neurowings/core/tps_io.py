@@ -71,6 +71,7 @@ def load_tps_into_image(img_data, tps_path: Path) -> None:
 
     # Формируем крылья
     img_data.wings = []
+    img_data._wings_sorted = False
     for idx in range(0, len(points), NUM_POINTS):
         wing_pts = points[idx:idx + NUM_POINTS]
         if len(wing_pts) == NUM_POINTS:
@@ -7,7 +7,7 @@
 """
 
 __all__ = [
-    'PointItem', 'WingLabelItem', 'BBoxItem', 'MeasurementLineItem',
+    'PointItem', 'WingLabelItem', 'BBoxItem', 'MeasurementLineItem', 'WingOverlayItem',
     'ZoomableGraphicsView', 'AnalysisWidget', 'GraphsWidget',
     'InterpretationWidget', 'GlobalInterpretationWidget',
     'BatchResultsWidget', 'PointSettingsDialog'
@@ -15,13 +15,14 @@ __all__ = [
 
 
 def __getattr__(name):
-    if name in {'PointItem', 'WingLabelItem', 'BBoxItem', 'MeasurementLineItem'}:
-        from .graphics_items import PointItem, WingLabelItem, BBoxItem, MeasurementLineItem
+    if name in {'PointItem', 'WingLabelItem', 'BBoxItem', 'MeasurementLineItem', 'WingOverlayItem'}:
+        from .graphics_items import PointItem, WingLabelItem, BBoxItem, MeasurementLineItem, WingOverlayItem
         return {
             'PointItem': PointItem,
             'WingLabelItem': WingLabelItem,
             'BBoxItem': BBoxItem,
             'MeasurementLineItem': MeasurementLineItem,
+            'WingOverlayItem': WingOverlayItem,
         }[name]
     if name == 'ZoomableGraphicsView':
         from .graphics_view import ZoomableGraphicsView
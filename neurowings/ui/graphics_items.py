@@ -5,11 +5,11 @@ NeuroWings - Графические элементы для сцены
 """
 
 from PyQt5.QtWidgets import (
-    QGraphicsEllipseItem, QGraphicsRectItem, QGraphicsLineItem,
+    QGraphicsItem, QGraphicsEllipseItem, QGraphicsRectItem, QGraphicsLineItem,
     QGraphicsSimpleTextItem
 )
-from PyQt5.QtCore import Qt
-from PyQt5.QtGui import QColor, QPen, QBrush, QFont
+from PyQt5.QtCore import Qt, QLineF, QRectF
+from PyQt5.QtGui import QColor, QPen, QBrush, QFont, QPainterPath, QPainterPathStroker
 
 from ..core.constants import (
     COLOR_NORMAL, COLOR_PROBLEM, COLOR_SELECTED,
@@ -269,4 +269,57 @@ class MeasurementLineItem(QGraphicsLineItem):
     def __init__(self, x1, y1, x2, y2, color=QColor(0, 255, 0), width=2, style=Qt.SolidLine):
         super().__init__(x1, y1, x2, y2)
         self.setPen(QPen(color, width, style))
-        self.setZValue(90)
\ No newline at end of file
+        self.setZValue(90)
+
+
+class WingOverlayItem(QGraphicsItem):
+    """
+    Все линии измерений одного крыла одним элементом сцены.
+    Вместо отдельного MeasurementLineItem на каждую линию - один paint()
+    и одна проверка boundingRect на крыло. Попадание мышью - только по самим
+    линиям (shape), иначе элемент перекрывал бы рамку крыла под ним.
+    """
+
+    def __init__(self, segments, width=2):
+        """
+        Args:
+            segments: список (x1, y1, x2, y2, color, style)
+            width: толщина линий
+        """
+        super().__init__()
+        # Подряд идущие линии с одинаковым пером рисуем одним drawLines
+        self._groups = []
+        for x1, y1, x2, y2, color, style in segments:
+            line = QLineF(x1, y1, x2, y2)
+            if self._groups and self._groups[-1][1] == (color.rgba(), style):
+                self._groups[-1][2].append(line)
+            else:
+                self._groups.append((QPen(color, width, style), (color.rgba(), style), [line]))
+
+        if segments:
+            xs = [v for seg in segments for v in (seg[0], seg[2])]
+            ys = [v for seg in segments for v in (seg[1], seg[3])]
+            self._rect = QRectF(min(xs), min(ys), max(xs) - min(xs), max(ys) - min(ys))
+            self._rect.adjust(-width, -width, width, width)
+        else:
+            self._rect = QRectF()
+
+        path = QPainterPath()
+        for x1, y1, x2, y2, *_ in segments:
+            path.moveTo(x1, y1)
+            path.lineTo(x2, y2)
+        stroker = QPainterPathStroker()
+        stroker.setWidth(width)
+        self._shape = stroker.createStroke(path)
+        self.setZValue(90)
+
+    def boundingRect(self):
+        return self._rect
+
+    def shape(self):
+        return self._shape
+
+    def paint(self, painter, option, widget=None):
+        for pen, _, lines in self._groups:
+            painter.setPen(pen)
+            painter.drawLines(lines)
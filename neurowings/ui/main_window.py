@@ -9,17 +9,21 @@ import os
 import json
 import sys
 import tempfile
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from typing import Dict, Optional, List, Tuple
 from urllib.parse import urlparse
 
+import numpy as np
+
 from ..core import (
     APP_NAME, APP_VERSION, APP_AUTHOR, APP_MAX_URL, APP_TELEGRAM_LABEL, APP_TELEGRAM_URL, APP_UPDATE_FEED_URL,
     NUM_POINTS,
     COLOR_NORMAL, COLOR_YOLO, COLOR_STAGE1, COLOR_STAGE2, COLOR_GT,
-    DEFAULT_POINT_RADIUS, YOLO_TO_WINGSDIG,
+    DEFAULT_POINT_RADIUS, YOLO_TO_WINGSDIG, STAGE2_CROP_SIZE, STAGE2_PORTABLE_CROP_SIZE,
     WingPoint, BBox, Wing, ImageData, EditMode,
     get_device, load_stage2_model, load_stage2_portable_model, load_subpixel_model,
+    load_onnx_model, load_yolo_model,
     TORCH_AVAILABLE, TORCH_IMPORT_ERROR, TORCHVISION_MODELS_AVAILABLE,
     TORCHVISION_MODELS_IMPORT_ERROR
 )
@@ -29,20 +33,23 @@ from ..core.update_manager import (
     launch_windows_update_script,
 )
 from ..core.tps_io import load_tps_into_image, save_tps_from_image
+from ..core.constants import (
+    YOLO_DET_IMAGE_SIZE, YOLO_DET_BATCH_SIZE, YOLO_POSE_IMAGE_SIZE, YOLO_POSE_BATCH_SIZE
+)
 
 from PyQt5.QtWidgets import (
     QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
-    QGraphicsScene, QGraphicsPixmapItem, QListWidget, QListWidgetItem,
+    QGraphicsScene, QGraphicsPixmapItem, QListWidget,
     QPushButton, QToolButton, QLabel, QCheckBox, QGroupBox,
     QSplitter, QToolBar, QFileDialog, QMessageBox, QProgressBar,
     QTableWidget, QTableWidgetItem, QHeaderView, QAbstractItemView,
     QShortcut, QRadioButton, QButtonGroup, QAction, QTabWidget, QGridLayout,
     QApplication, QMenu, QSizePolicy, QDialog, QDialogButtonBox, QProgressDialog
 )
-from PyQt5.QtCore import Qt, pyqtSignal, QTimer, QUrl
-from PyQt5.QtGui import QPixmap, QColor, QKeySequence, QPen, QDesktopServices
+from PyQt5.QtCore import Qt, pyqtSignal, QTimer, QUrl, QThreadPool
+from PyQt5.QtGui import QPixmap, QPixmapCache, QColor, QKeySequence, QPen, QDesktopServices
 
-from .graphics_items import PointItem, WingLabelItem, BBoxItem, MeasurementLineItem
+from .graphics_items import PointItem, WingLabelItem, BBoxItem, WingOverlayItem
 from .graphics_view import ZoomableGraphicsView
 from .analysis_widget import AnalysisWidget
 from .graphs_widget import GraphsWidget
@@ -50,7 +57,22 @@ from .interpretation_widget import InterpretationWidget, GlobalInterpretationWid
 from .batch_widget import BatchResultsWidget
 from .dialogs import PointSettingsDialog
 
-from ..workers import ProcessingWorker, UpdateCheckWorker, UpdateDownloadWorker
+from ..workers import ImagePrefetchTask, ProcessingWorker, UpdateCheckWorker, UpdateDownloadWorker
+
+# Лимит QPixmapCache (КБ): несколько полноразмерных снимков микроскопа
+PIXMAP_CACHE_LIMIT_KB = 512 * 1024
+
+# Число потоков для чтения TPS при открытии папки
+TPS_LOAD_WORKERS = 8
+
+# Цвет активной точки в зависимости от её источника
+SOURCE_COLOR = {
+    'yolo': COLOR_YOLO,
+    'stage1': COLOR_STAGE1,
+    'stage2': COLOR_STAGE2,
+    'gt': COLOR_GT,
+    'manual': COLOR_STAGE2,
+}
 
 
 class MainWindow(QMainWindow):
@@ -86,6 +108,8 @@ class MainWindow(QMainWindow):
         
         # Состояние UI
         self.point_items: List[PointItem] = []
+        self._selected_point_items: List[PointItem] = []
+        self._active_points_by_wing: Dict[int, List[PointItem]] = {}
         self.wing_labels = []
         self.bbox_items = []
         self.measurement_lines = []
@@ -110,6 +134,16 @@ class MainWindow(QMainWindow):
         self._update_download_worker = None
         self._update_progress_dialog = None
         self._skip_unsaved_prompt = False
+
+        # Отложенное обновление сводной таблицы: серия правок даёт одну перестройку
+        self._batch_update_timer = QTimer(self)
+        self._batch_update_timer.setSingleShot(True)
+        self._batch_update_timer.setInterval(50)
+        self._batch_update_timer.timeout.connect(self._do_batch_update)
+
+        # Фоновая предзагрузка соседних изображений списка файлов
+        QPixmapCache.setCacheLimit(PIXMAP_CACHE_LIMIT_KB)
+        self._prefetch_tasks: Dict[str, ImagePrefetchTask] = {}
         
         self._setup_ui()
         self._setup_menu()
@@ -336,6 +370,8 @@ class MainWindow(QMainWindow):
         sel_layout.addWidget(btn_all_stage2, 0, 3)
         
         self.point_model_groups: List[QButtonGroup] = []
+        # Текущий выбор моделей по точкам, обновляется при переключении радиокнопок
+        self._current_selection: List[str] = ['stage2'] * NUM_POINTS
         for idx in range(NUM_POINTS):
             lbl = QLabel(str(idx + 1))
             sel_layout.addWidget(lbl, idx + 1, 0)
@@ -362,6 +398,7 @@ class MainWindow(QMainWindow):
             
             rb_stage2.setChecked(True)  # По умолчанию выбран итеративный Stage2
             group.buttonClicked.connect(self._on_point_model_changed)
+            group.buttonToggled.connect(self._on_point_model_toggled)
             self.point_model_groups.append(group)
         
         # Кнопки применения выбора
@@ -684,7 +721,8 @@ class MainWindow(QMainWindow):
             return
 
         try:
-            from ultralytics import YOLO
+            # TensorRT-движки YOLO собираются только по запросу (--build-engines): это минуты
+            build_engines = "--build-engines" in sys.argv
 
             # В сборках PyInstaller модели могут лежать в _MEIPASS, рядом с EXE
             # или в _internal. Оставляем и старые пути исходников.
@@ -716,7 +754,10 @@ class MainWindow(QMainWindow):
                     path = search_dir / name
                     if path.exists():
                         print(f"Загрузка модели детекции: {path}")
-                        self.model_det = YOLO(str(path))
+                        self.model_det = load_yolo_model(
+                            str(path), 'detect', YOLO_DET_IMAGE_SIZE, YOLO_DET_BATCH_SIZE,
+                            self.device, build_engines
+                        )
                         break
                 if self.model_det:
                     break
@@ -730,7 +771,10 @@ class MainWindow(QMainWindow):
                     path = search_dir / name
                     if path.exists():
                         print(f"Загрузка модели позы: {path}")
-                        self.model_pose = YOLO(str(path))
+                        self.model_pose = load_yolo_model(
+                            str(path), 'pose', YOLO_POSE_IMAGE_SIZE, YOLO_POSE_BATCH_SIZE,
+                            self.device, build_engines
+                        )
                         break
                 if self.model_pose:
                     break
@@ -743,7 +787,9 @@ class MainWindow(QMainWindow):
                 for search_dir in search_dirs:
                     path = search_dir / name
                     if path.exists():
-                        self.model_stage2 = load_stage2_model(str(path), self.device)
+                        self.model_stage2 = load_onnx_model(
+                            load_stage2_model(str(path), self.device), str(path), STAGE2_CROP_SIZE, self.device
+                        )
                         break
                 if self.model_stage2:
                     break
@@ -753,7 +799,10 @@ class MainWindow(QMainWindow):
                 for search_dir in search_dirs:
                     path = search_dir / name
                     if path.exists():
-                        self.model_stage2_portable = load_stage2_portable_model(str(path), self.device)
+                        self.model_stage2_portable = load_onnx_model(
+                            load_stage2_portable_model(str(path), self.device), str(path),
+                            STAGE2_PORTABLE_CROP_SIZE, self.device
+                        )
                         break
                 if self.model_stage2_portable:
                     break
@@ -819,41 +868,67 @@ class MainWindow(QMainWindow):
         images_set = set()
         for ext in ['*.jpg', '*.jpeg', '*.png']:
             images_set.update(self.current_folder.glob(ext))
-        images = list(images_set)
-        
-        for idx, img_path in enumerate(sorted(images), start=1):
+        images = sorted(images_set)
+
+        tps_jobs = []
+        for img_path in images:
             img_data = ImageData(path=img_path)
             self.images[str(img_path)] = img_data
-            
+
             tps_path = img_path.with_suffix('.tps')
             if tps_path.exists():
-                self._load_tps_for_image(img_data, tps_path)
-            
-            has_data = "✓" if img_data.wings else "○"
-            item = QListWidgetItem(f"{has_data} {idx}) {img_path.name}")
-            item.setData(Qt.UserRole, str(img_path))
-            item.setFlags(item.flags() | Qt.ItemIsUserCheckable)
-            item.setCheckState(Qt.Unchecked)
-            self.file_list.addItem(item)
+                tps_jobs.append((img_data, tps_path))
+
+        self._load_tps_files(tps_jobs)
+        
+        # Одна вставка строк вместо addItem на каждый файл, без перерисовки и сигналов
+        self.file_list.setUpdatesEnabled(False)
+        self.file_list.blockSignals(True)
+        try:
+            self.file_list.addItems([
+                f"{'✓' if self.images[str(img_path)].wings else '○'} {idx}) {img_path.name}"
+                for idx, img_path in enumerate(images, start=1)
+            ])
+            for row, img_path in enumerate(images):
+                item = self.file_list.item(row)
+                item.setData(Qt.UserRole, str(img_path))
+                item.setFlags(item.flags() | Qt.ItemIsUserCheckable)
+                item.setCheckState(Qt.Unchecked)
+        finally:
+            self.file_list.blockSignals(False)
+            self.file_list.setUpdatesEnabled(True)
         
         self._update_files_stats()
-        self.batch_widget.update_batch_results(self.images)
+        self._schedule_batch_update()
         
         if self.file_list.count() > 0:
             self.file_list.setCurrentRow(0)
             self._load_current_image()
     
-    def _load_tps_for_image(self, img_data: ImageData, tps_path: Path):
-        """Загрузить TPS файл (через tps_io)"""
-        try:
-            load_tps_into_image(img_data, tps_path)
-            # Точки из TPS считаем ground truth
-            for wing in img_data.wings:
-                wing.point_sources = ['gt'] * NUM_POINTS
-            img_data.is_processed = True
-            img_data.analyze_all_wings()
-        except Exception as e:
-            print(f"Ошибка TPS: {e}")
+    def _load_tps_files(self, jobs: List[Tuple[ImageData, Path]]):
+        """
+        Загрузить TPS файлы (через tps_io).
+        Чтение и разбор идут параллельно в пуле потоков (каждая задача трогает
+        только свой ImageData), анализ крыльев - в GUI-потоке.
+        """
+        if not jobs:
+            return
+
+        with ThreadPoolExecutor(max_workers=min(TPS_LOAD_WORKERS, len(jobs))) as pool:
+            futures = [
+                (img_data, pool.submit(load_tps_into_image, img_data, tps_path))
+                for img_data, tps_path in jobs
+            ]
+            for img_data, future in futures:
+                try:
+                    future.result()
+                    # Точки из TPS считаем ground truth
+                    for wing in img_data.wings:
+                        wing.point_sources = ['gt'] * NUM_POINTS
+                    img_data.is_processed = True
+                    img_data.analyze_all_wings()
+                except Exception as e:
+                    print(f"Ошибка TPS: {e}")
     
     def _on_file_clicked(self, item):
         """Обработка клика по файлу"""
@@ -871,12 +946,17 @@ class MainWindow(QMainWindow):
         
         self.current_image = self.images[path]
         
-        pixmap = QPixmap(path)
+        pixmap = self._get_cached_pixmap(path)
+        if pixmap is None:
+            pixmap = QPixmap(path)
+            QPixmapCache.insert(path, pixmap)
         self.current_image.width = pixmap.width()
         self.current_image.height = pixmap.height()
         
         self.scene.clear()
         self.point_items.clear()
+        self._selected_point_items.clear()
+        self._active_points_by_wing.clear()
         self.wing_labels.clear()
         self.bbox_items.clear()
         self.measurement_lines.clear()
@@ -892,6 +972,35 @@ class MainWindow(QMainWindow):
 
         self._update_analysis_widget()
         self._update_interpretation_widgets()
+        self._prefetch_neighbor_images()
+
+    def _get_cached_pixmap(self, path: str) -> Optional[QPixmap]:
+        """Достать изображение из QPixmapCache (None, если его там нет)"""
+        pixmap = QPixmapCache.find(path)
+        if pixmap is None or pixmap.isNull():
+            return None
+        return pixmap
+
+    def _prefetch_neighbor_images(self):
+        """Декодировать соседние файлы списка в фоне, пока пользователь смотрит текущий"""
+        row = self.file_list.currentRow()
+        for neighbor in (row + 1, row - 1):
+            item = self.file_list.item(neighbor)
+            if item is None:
+                continue
+            path = item.data(Qt.UserRole)
+            if path in self._prefetch_tasks or self._get_cached_pixmap(path) is not None:
+                continue
+            task = ImagePrefetchTask(path)
+            task.signals.loaded.connect(self._on_image_prefetched)
+            self._prefetch_tasks[path] = task
+            QThreadPool.globalInstance().start(task)
+
+    def _on_image_prefetched(self, path: str, image):
+        """Положить декодированное в фоне изображение в кэш (в GUI-потоке)"""
+        self._prefetch_tasks.pop(path, None)
+        if not image.isNull():
+            QPixmapCache.insert(path, QPixmap.fromImage(image))
     
     def _prev_file(self):
         """Предыдущий файл"""
@@ -933,8 +1042,18 @@ class MainWindow(QMainWindow):
                 self.analysis_widget.calculate_analysis_results(img_data)
 
         # Теперь обновляем таблицу с новыми результатами
+        self._batch_update_timer.stop()
         self.batch_widget.update_batch_results(self.images)
     
+    def _schedule_batch_update(self):
+        """Запланировать обновление сводной таблицы (не чаще раза в 50 мс)"""
+        if not self._batch_update_timer.isActive():
+            self._batch_update_timer.start()
+
+    def _do_batch_update(self):
+        """Перестроить сводную таблицу (вызывается таймером)"""
+        self.batch_widget.update_batch_results(self.images)
+
     def _on_display_toggle(self, checked):
         """Переключение отображения"""
         # Обновляем флаги отображения
@@ -967,13 +1086,14 @@ class MainWindow(QMainWindow):
         self._update_analysis_widget()
         self._update_interpretation_widgets()
 
+    def _on_point_model_toggled(self, button, checked):
+        """Запомнить выбранную модель точки при переключении радиокнопки"""
+        if checked:
+            self._current_selection[button.property('point_idx')] = button.property('model_type')
+
     def _get_point_model_selection(self):
-        """Считать выбранные модели для каждой точки из радиокнопок"""
-        selection = []
-        for group in self.point_model_groups:
-            checked = group.checkedButton()
-            selection.append(checked.property('model_type') if checked else 'stage2')
-        return selection
+        """Выбранные модели для каждой точки (копия кэша радиокнопок)"""
+        return self._current_selection.copy()
 
     def _apply_point_selection(self, scope: str):
         """
@@ -999,7 +1119,7 @@ class MainWindow(QMainWindow):
         if self.current_image:
             self._update_display()
         self._update_analysis_widget()
-        self.batch_widget.update_batch_results(self.images)
+        self._schedule_batch_update()
         self._update_interpretation_widgets()
 
     def _set_all_points_model(self, model_type: str):
@@ -1047,6 +1167,8 @@ class MainWindow(QMainWindow):
         for item in self.point_items:
             self.scene.removeItem(item)
         self.point_items.clear()
+        self._selected_point_items.clear()
+        self._active_points_by_wing.clear()
         
         for label in self.wing_labels:
             self.scene.removeItem(label)
@@ -1060,9 +1182,25 @@ class MainWindow(QMainWindow):
             self.scene.removeItem(line)
         self.measurement_lines.clear()
         
+        show_yolo = self.show_yolo
+        show_stage1 = self.show_stage1
+        show_stage2 = self.show_stage2
+        show_gt = self.show_gt
+        show_bboxes = self.show_bboxes
+        show_measurement_lines = self.show_measurement_lines
+
+        # Локальные ссылки для горячих циклов ниже
+        scene_add = self.scene.addItem
+        pts_append = self.point_items.append
+        make_point = PointItem
+        r = self.point_radius
+        r_compare = r * 0.7
+
         self._sort_wings_internal()
         for wing_idx, wing in enumerate(self.current_image.wings):
             cx, cy = wing.get_center()
+            point_sources = wing.point_sources
+            n_sources = len(point_sources)
             
             is_ok = wing.analysis.is_identified if wing.analysis else False
             wing_label = WingLabelItem(wing_idx, cx, cy, is_ok)
@@ -1070,142 +1208,133 @@ class MainWindow(QMainWindow):
             self.wing_labels.append(wing_label)
             
             # BBOX
-            if self.show_bboxes and wing.bbox:
+            if show_bboxes and wing.bbox:
                 bbox_item = BBoxItem(wing.bbox.x1, wing.bbox.y1, wing.bbox.x2, wing.bbox.y2, wing_idx)
                 self.scene.addItem(bbox_item)
                 self.bbox_items.append(bbox_item)
             
+            active_points = wing.get_active_points()
+            active_xy = np.asarray(active_points[:8], dtype=np.float64).reshape(-1, 2)
+
             # Линии измерений
-            if self.show_measurement_lines and len(wing.points) == 8:
-                points = wing.get_active_points()
-                self._draw_measurement_lines(points, wing.analysis, wing.bbox)
-            
+            if show_measurement_lines and len(wing.points) == 8:
+                self._draw_measurement_lines(active_points, wing.analysis, wing.bbox)
+
             problem_points = wing.analysis.problem_points if wing.analysis else []
-            active_points = wing.get_active_points()
 
             # АКТИВНЫЕ ТОЧКИ - ВСЕГДА показываются (это точки, которые идут в расчет и TPS)
             # Цвет точки зависит от её источника (yolo/stage1/stage2/gt)
             if active_points:
-                for point_idx in range(min(8, len(active_points))):
+                wing_active_items = self._active_points_by_wing.setdefault(wing_idx, [])
+                # Неинициализированные точки (0, 0) отбрасываются одной маской
+                for point_idx in np.flatnonzero(active_xy.any(axis=1)).tolist():
                     px, py = active_points[point_idx]
-                    if px == 0 and py == 0:
-                        continue  # Пропускаем неинициализированные точки
                     is_problem = point_idx in problem_points
 
                     # Определяем источник и цвет точки
-                    source = wing.point_sources[point_idx] if point_idx < len(wing.point_sources) else 'stage2'
+                    source = point_sources[point_idx] if point_idx < n_sources else 'stage2'
 
                     # Цвет зависит от источника
-                    if source == 'yolo':
-                        point_color = COLOR_YOLO
-                    elif source == 'stage1':
-                        point_color = COLOR_STAGE1
-                    elif source == 'stage2':
-                        point_color = COLOR_STAGE2
-                    elif source == 'gt':
-                        point_color = COLOR_GT
-                    elif source == 'manual':
-                        point_color = COLOR_STAGE2
-                    else:
-                        point_color = COLOR_STAGE2
+                    point_color = SOURCE_COLOR.get(source, COLOR_STAGE2)
 
                     global_idx = wing_idx * 8 + point_idx
-                    pt_item = PointItem(
+                    pt_item = make_point(
                         px, py, global_idx, wing_idx, point_idx,
-                        radius=self.point_radius, color=point_color,
+                        radius=r, color=point_color,
                         is_problem=is_problem, source_type=source
                     )
                     # Активные точки должны быть поверх всех остальных (z-value = 200)
                     pt_item.setZValue(200)
 
-                    self.scene.addItem(pt_item)
-                    self.point_items.append(pt_item)
+                    scene_add(pt_item)
+                    pts_append(pt_item)
+                    wing_active_items.append(pt_item)
             # ДОПОЛНИТЕЛЬНЫЕ ТОЧКИ ДЛЯ СРАВНЕНИЯ (оверлеи) - показываются только если включены соответствующие чекбоксы
             # Это точки из других моделей, которые НЕ используются в расчетах, но показываются для сравнения
 
             # YOLO точки для сравнения
-            if self.show_yolo and hasattr(wing, 'points_yolo') and wing.points_yolo:
+            if show_yolo and wing.points_yolo:
                 for point_idx, point in enumerate(wing.points_yolo):
                     if point_idx >= 8:
                         break
                     # Проверяем, что это не активная точка
-                    source = wing.point_sources[point_idx] if point_idx < len(wing.point_sources) else 'stage2'
+                    source = point_sources[point_idx] if point_idx < n_sources else 'stage2'
                     if source == 'yolo':
                         continue  # Эта точка уже показана как активная
                     # Показываем как дополнительную точку БЕЗ номера
-                    pt_item = PointItem(
+                    pt_item = make_point(
                         point.x, point.y, -100, wing_idx, point_idx,
-                        radius=self.point_radius * 0.7, color=COLOR_YOLO,
+                        radius=r_compare, color=COLOR_YOLO,
                         is_problem=False, source_type='yolo_compare'
                     )
                     pt_item.setOpacity(0.5)
                     pt_item.setZValue(90)
-                    self.scene.addItem(pt_item)
-                    self.point_items.append(pt_item)
+                    scene_add(pt_item)
+                    pts_append(pt_item)
 
             # Stage1 точки для сравнения
-            if self.show_stage1 and hasattr(wing, 'points_stage1') and wing.points_stage1:
+            if show_stage1 and wing.points_stage1:
                 for point_idx, point in enumerate(wing.points_stage1):
                     if point_idx >= 8:
                         break
-                    source = wing.point_sources[point_idx] if point_idx < len(wing.point_sources) else 'stage2'
+                    source = point_sources[point_idx] if point_idx < n_sources else 'stage2'
                     if source == 'stage1':
                         continue  # Эта точка уже показана как активная
-                    pt_item = PointItem(
+                    pt_item = make_point(
                         point.x, point.y, -100, wing_idx, point_idx,
-                        radius=self.point_radius * 0.7, color=COLOR_STAGE1,
+                        radius=r_compare, color=COLOR_STAGE1,
                         is_problem=False, source_type='stage1_compare'
                     )
                     pt_item.setOpacity(0.5)
                     pt_item.setZValue(90)
-                    self.scene.addItem(pt_item)
-                    self.point_items.append(pt_item)
+                    scene_add(pt_item)
+                    pts_append(pt_item)
 
             # Stage2 точки для сравнения
-            if self.show_stage2 and hasattr(wing, 'points_stage2') and wing.points_stage2:
+            if show_stage2 and wing.points_stage2:
                 for point_idx, point in enumerate(wing.points_stage2):
                     if point_idx >= 8:
                         break
-                    source = wing.point_sources[point_idx] if point_idx < len(wing.point_sources) else 'stage2'
+                    source = point_sources[point_idx] if point_idx < n_sources else 'stage2'
                     if source == 'stage2':
                         continue  # Эта точка уже показана как активная
-                    pt_item = PointItem(
+                    pt_item = make_point(
                         point.x, point.y, -100, wing_idx, point_idx,
-                        radius=self.point_radius * 0.7, color=COLOR_STAGE2,
+                        radius=r_compare, color=COLOR_STAGE2,
                         is_problem=False, source_type='stage2_compare'
                     )
                     pt_item.setOpacity(0.5)
                     pt_item.setZValue(90)
-                    self.scene.addItem(pt_item)
-                    self.point_items.append(pt_item)
+                    scene_add(pt_item)
+                    pts_append(pt_item)
 
             # Ground Truth точки (TPS) - показываем если включен чекбокс для сравнения
             # Это точки из TPS файла, если они отличаются от активных точек
-            if self.show_gt:
+            if show_gt:
                 # Показываем только если активные точки НЕ являются GT
                 # и если есть отдельные Ground Truth точки для сравнения
-                if hasattr(wing, 'points') and wing.points:
+                if wing.points:
                     # Проверяем, что активные точки не являются GT
-                    source = wing.point_sources[0] if wing.point_sources else 'stage2'
+                    source = point_sources[0] if point_sources else 'stage2'
                     if source != 'gt':
-                        for point_idx, point in enumerate(wing.points):
-                            if point_idx >= 8:
-                                break
-                            # Проверяем, что это не те же точки, что активные
-                            if point_idx < len(active_points):
-                                apx, apy = active_points[point_idx]
-                                if abs(point.x - apx) < 0.1 and abs(point.y - apy) < 0.1:
-                                    continue  # Это те же точки, что активные, пропускаем
+                        gt_points = wing.points[:8]
+                        gt_xy = wing.points_xy[:8]
+                        # Пропускаем точки, совпадающие с активными (это те же точки)
+                        show_mask = np.ones(len(gt_points), dtype=bool)
+                        n_active = min(len(active_xy), len(gt_points))
+                        show_mask[:n_active] = np.abs(gt_xy[:n_active] - active_xy[:n_active]).max(axis=1) >= 0.1
+                        for point_idx in np.flatnonzero(show_mask).tolist():
+                            point = gt_points[point_idx]
                             # Дополнительные точки показываем БЕЗ номеров (global_idx не используется)
-                            pt_item = PointItem(
+                            pt_item = make_point(
                                 point.x, point.y, -100, wing_idx, point_idx,  # global_idx < 0 - без номера
-                                radius=self.point_radius * 0.7, color=COLOR_GT,
+                                radius=r_compare, color=COLOR_GT,
                                 is_problem=False, source_type='gt_compare'
                             )
                             pt_item.setOpacity(0.5)
                             pt_item.setZValue(90)  # Ниже активных точек
-                            self.scene.addItem(pt_item)
-                            self.point_items.append(pt_item)
+                            scene_add(pt_item)
+                            pts_append(pt_item)
         
         self._update_wings_table()
         
@@ -1217,62 +1346,57 @@ class MainWindow(QMainWindow):
         self.lbl_wings_count.setText(f"Крыльев: {total_wings} (✓{identified})")
     
     def _draw_measurement_lines(self, points, analysis, bbox=None):
-        """Отрисовка линий измерений"""
+        """Отрисовка линий измерений (все линии крыла - один элемент сцены)"""
         if len(points) != 8:
             return
         
         p1, p2, p3, p4, p5, p6, p7, p8 = points
         
         # P1-P2 (базовая линия)
-        line = MeasurementLineItem(p1[0], p1[1], p2[0], p2[1], QColor(0, 100, 255), 2, Qt.SolidLine)
-        self.scene.addItem(line)
-        self.measurement_lines.append(line)
-
         # Убраны все красные и зеленые перпендикулярные линии по запросу пользователя
-        
         # P3-P4, P5-P6, P6-P7, P5-P7
-        for (pa, pb, color, style) in [
-            (p3, p4, QColor(200, 0, 200), Qt.SolidLine),
-            (p5, p6, QColor(255, 50, 50), Qt.SolidLine),
-            (p6, p7, QColor(180, 0, 0), Qt.SolidLine),
-            (p5, p7, QColor(255, 100, 150), Qt.DashDotLine),
-        ]:
-            line = MeasurementLineItem(pa[0], pa[1], pb[0], pb[1], color, 2, style)
-            self.scene.addItem(line)
-            self.measurement_lines.append(line)
+        segments = [
+            (pa[0], pa[1], pb[0], pb[1], color, style)
+            for (pa, pb, color, style) in [
+                (p1, p2, QColor(0, 100, 255), Qt.SolidLine),
+                (p3, p4, QColor(200, 0, 200), Qt.SolidLine),
+                (p5, p6, QColor(255, 50, 50), Qt.SolidLine),
+                (p6, p7, QColor(180, 0, 0), Qt.SolidLine),
+                (p5, p7, QColor(255, 100, 150), Qt.DashDotLine),
+            ]
+        ]
+        overlay = WingOverlayItem(segments, width=2)
+        self.scene.addItem(overlay)
+        self.measurement_lines.append(overlay)
     
     def _sort_wings_internal(self):
         """Сортировка крыльев"""
         if not self.current_image or not self.current_image.wings:
             return
+        if self.current_image._wings_sorted:
+            return
         
-        wings_with_centers = [(wing, *wing.get_center()) for wing in self.current_image.wings]
-        wings_with_centers.sort(key=lambda w: (w[2], w[1]))
-        
-        rows = []
-        current_row = []
-        current_y = None
+        wings = self.current_image.wings
+        centers = np.fromiter(
+            (c for wing in wings for c in wing.get_center()), dtype=np.float64, count=2 * len(wings)
+        ).reshape(-1, 2)
+
+        # Сортировка по (cy, cx), затем разбиение на ряды: ряд продолжается,
+        # пока cy отличается от cy первого крыла ряда меньше чем на row_tolerance
+        order = np.lexsort((centers[:, 0], centers[:, 1]))
+        sorted_y = centers[order, 1]
         row_tolerance = 100
-        
-        for wing, cx, cy in wings_with_centers:
-            if current_y is None or abs(cy - current_y) < row_tolerance:
-                current_row.append((wing, cx, cy))
-                if current_y is None:
-                    current_y = cy
-            else:
-                rows.append(current_row)
-                current_row = [(wing, cx, cy)]
-                current_y = cy
-        
-        if current_row:
-            rows.append(current_row)
-        
-        sorted_wings = []
-        for row in rows:
-            row.sort(key=lambda w: w[1])
-            sorted_wings.extend([w[0] for w in row])
-        
-        self.current_image.wings = sorted_wings
+
+        final_order = []
+        start = 0
+        while start < len(order):
+            end = int(np.searchsorted(sorted_y, sorted_y[start] + row_tolerance, side='left'))
+            row = order[start:end]
+            final_order.extend(row[np.argsort(centers[row, 0], kind='stable')].tolist())
+            start = end
+
+        self.current_image.wings = [wings[i] for i in final_order]
+        self.current_image._wings_sorted = True
     
     def _update_wings_table(self):
         """Обновить таблицу крыльев"""
@@ -1280,26 +1404,34 @@ class MainWindow(QMainWindow):
             self.wings_table.setRowCount(0)
             return
 
-        self.wings_table.setRowCount(len(self.current_image.wings))
-
-        for i, wing in enumerate(self.current_image.wings):
-            self.wings_table.setItem(i, 0, QTableWidgetItem(str(i + 1)))
-
-            if wing.analysis:
-                breeds = ", ".join(wing.analysis.breeds) if wing.analysis.breeds else "—"
-                self.wings_table.setItem(i, 1, QTableWidgetItem(breeds))
-                self.wings_table.setItem(i, 2, QTableWidgetItem(f"{wing.analysis.CI:.2f}"))
-
-                status = "✅" if wing.analysis.is_identified else "❌"
-                self.wings_table.setItem(i, 3, QTableWidgetItem(status))
-            else:
-                # Если анализ отсутствует, заполняем пустыми значениями
-                self.wings_table.setItem(i, 1, QTableWidgetItem("—"))
-                self.wings_table.setItem(i, 2, QTableWidgetItem("—"))
-                self.wings_table.setItem(i, 3, QTableWidgetItem("❌"))
+        tbl = self.wings_table
+        tbl.blockSignals(True)
+        tbl.setUpdatesEnabled(False)
+        try:
+            tbl.setRowCount(len(self.current_image.wings))
+
+            for i, wing in enumerate(self.current_image.wings):
+                if wing.analysis:
+                    breeds = ", ".join(wing.analysis.breeds) if wing.analysis.breeds else "—"
+                    ci = f"{wing.analysis.CI:.2f}"
+                    status = "✅" if wing.analysis.is_identified else "❌"
+                else:
+                    # Если анализ отсутствует, заполняем пустыми значениями
+                    breeds, ci, status = "—", "—", "❌"
+
+                # Существующие ячейки переиспользуем, создаём только недостающие
+                for col, text in enumerate((str(i + 1), breeds, ci, status)):
+                    cell = tbl.item(i, col)
+                    if cell is None:
+                        tbl.setItem(i, col, QTableWidgetItem(text))
+                    elif cell.text() != text:
+                        cell.setText(text)
+        finally:
+            tbl.blockSignals(False)
+            tbl.setUpdatesEnabled(True)
 
         # Принудительно обновляем виджет таблицы
-        self.wings_table.viewport().update()
+        tbl.viewport().update()
     
     def _on_wing_selected(self, item):
         """Выбор крыла"""
@@ -1309,13 +1441,8 @@ class MainWindow(QMainWindow):
 
         self.selected_wing_idx = row
 
-        for pt_item in self.point_items:
-            pt_item.set_selected(False)
-
         if row < len(self.current_image.wings):
-            for pt_item in self.point_items:
-                if pt_item.wing_idx == row and pt_item.source_type == 'active':
-                    pt_item.set_selected(True)
+            self._select_point_items(list(self._active_points_by_wing.get(row, [])))
 
             cx, cy = self.current_image.wings[row].get_center()
 
@@ -1333,12 +1460,7 @@ class MainWindow(QMainWindow):
         self.tab_widget.setCurrentIndex(0)
         self.selected_wing_idx = wing_idx
         
-        for pt_item in self.point_items:
-            pt_item.set_selected(False)
-        
-        for pt_item in self.point_items:
-            if pt_item.wing_idx == wing_idx and pt_item.source_type == 'active':
-                pt_item.set_selected(True)
+        self._select_point_items(list(self._active_points_by_wing.get(wing_idx, [])))
 
         cx, cy = self.current_image.wings[wing_idx].get_center()
         self.view.resetTransform()
@@ -1365,13 +1487,20 @@ class MainWindow(QMainWindow):
     
     def _on_point_clicked(self, global_idx: int, wing_idx: int, point_idx: int):
         """Клик по точке"""
-        for item in self.point_items:
-            item.set_selected(False)
-        
         if 0 <= global_idx < len(self.point_items):
-            self.point_items[global_idx].set_selected(True)
+            self._select_point_items([self.point_items[global_idx]])
+        else:
+            self._select_point_items([])
         
         self.wings_table.selectRow(wing_idx)
+
+    def _select_point_items(self, items: List[PointItem]):
+        """Выделить точки, сняв выделение только с ранее выделенных"""
+        for item in self._selected_point_items:
+            item.set_selected(False)
+        for item in items:
+            item.set_selected(True)
+        self._selected_point_items = items
     
     def _on_point_moved(self, wing_idx: int, point_idx: int, x: float, y: float):
         """Перемещение точки"""
@@ -1387,14 +1516,15 @@ class MainWindow(QMainWindow):
                 if point_idx < len(wing.point_sources):
                     wing.point_sources[point_idx] = 'manual'
                 self.current_image.is_modified = True
+                self.current_image._wings_sorted = False
 
+                # Крылья анализируются независимо - пересчитываем только изменённое
                 wing.analyze(image_height=self.current_image.height if self.current_image.height > 0 else None)
-                self.current_image.analyze_all_wings()  # Пересчитываем все крылья
                 self._update_display()
                 self._update_analysis_widget()
                 self._update_interpretation_widgets()
                 self._update_wings_table()  # Обновляем таблицу крыльев ПОСЛЕ всех расчетов
-                self.batch_widget.update_batch_results(self.images)
+                self._schedule_batch_update()
     
     def _on_bbox_created(self, x1, y1, x2, y2):
         """Создание рамки"""
@@ -1406,6 +1536,7 @@ class MainWindow(QMainWindow):
             bbox=BBox(x1, y1, x2, y2)
         )
         self.current_image.wings.append(wing)
+        self.current_image._wings_sorted = False
         self.current_image.is_modified = True
         self._update_display()
 
@@ -1417,12 +1548,13 @@ class MainWindow(QMainWindow):
         if 0 <= wing_idx < len(self.current_image.wings):
             wing = self.current_image.wings[wing_idx]
             wing.bbox = BBox(x1, y1, x2, y2)
+            self.current_image._wings_sorted = False
+            wing.analyze(image_height=self.current_image.height if self.current_image.height > 0 else None)
         self.current_image.is_modified = True
-        self.current_image.analyze_all_wings()
         self._update_display()
         self._update_analysis_widget()
         self._update_interpretation_widgets()
-        self.batch_widget.update_batch_results(self.images)
+        self._schedule_batch_update()
 
     def _on_point_delete(self, wing_idx, point_idx):
         """Удаление точки или крыла"""
@@ -1458,6 +1590,7 @@ class MainWindow(QMainWindow):
                         points[point_idx].x = 0
                         points[point_idx].y = 0
                         self.current_image.is_modified = True
+                        self.current_image._wings_sorted = False
                         wing.analyze()  # Пересчитываем только это крыло
                         self._update_display()
                         self._update_analysis_widget()
@@ -1470,12 +1603,13 @@ class MainWindow(QMainWindow):
             )
             if reply == QMessageBox.Yes:
                 del self.current_image.wings[wing_idx]
+                self.current_image._wings_sorted = False
                 self.current_image.is_modified = True
                 self.current_image.analyze_all_wings()  # Пересчитываем все крылья
                 self._update_display()
                 self._update_analysis_widget()
                 self._update_interpretation_widgets()
-                self.batch_widget.update_batch_results(self.images)
+                self._schedule_batch_update()
     
     def _on_bbox_delete(self, wing_idx):
         """Удаление рамки"""
@@ -1508,11 +1642,12 @@ class MainWindow(QMainWindow):
             wing = Wing(points=[WingPoint(x=pt[0], y=pt[1], is_manual=True) for pt in self.adding_points])
             wing.analyze(image_height=self.current_image.height if self.current_image.height > 0 else None)
             self.current_image.wings.append(wing)
+            self.current_image._wings_sorted = False
             self.current_image.is_modified = True
             self._cancel_adding()
             self._update_display()
             self._update_analysis_widget()
-            self.batch_widget.update_batch_results(self.images)
+            self._schedule_batch_update()
             self.statusBar().showMessage("Крыло добавлено!")
     
     def _cancel_adding(self):
@@ -1569,39 +1704,43 @@ class MainWindow(QMainWindow):
         self.progress_bar.setMaximum(total)
         self.progress_bar.setValue(current)
         self.statusBar().showMessage(message)
-        QApplication.processEvents()
     
     def _on_finished(self, results):
         """Завершение обработки"""
         self.progress_bar.setVisible(False)
         
-        for path_str, wings in results.items():
+        for path_str, (wings, width, height) in results.items():
             if path_str in self.images:
                 img_data = self.images[path_str]
                 img_data.wings = wings
+                img_data._wings_sorted = False
                 img_data.is_processed = True
                 
-                # Убедимся, что размеры изображения установлены для правильных расчетов
-                if img_data.height == 0:
-                    pixmap = QPixmap(str(img_data.path))
-                    img_data.width = pixmap.width()
-                    img_data.height = pixmap.height()
+                # Размеры изображения для правильных расчетов - из воркера (без повторного чтения файла)
+                img_data.width = width
+                img_data.height = height
                 
                 img_data.analyze_all_wings()
         
-        for i in range(self.file_list.count()):
-            item = self.file_list.item(i)
-            path = item.data(Qt.UserRole)
-            if path in self.images and self.images[path].wings:
-                text = item.text()
-                if text.startswith("â—‹"):
-                    item.setText("✓" + text[1:])
+        # Отметки в списке файлов - без перерисовки на каждый элемент
+        self.file_list.setUpdatesEnabled(False)
+        try:
+            for i in range(self.file_list.count()):
+                item = self.file_list.item(i)
+                path = item.data(Qt.UserRole)
+                if path in results and self.images[path].wings:
+                    text = item.text()
+                    if text.startswith("○"):
+                        item.setText("✓" + text[1:])
+        finally:
+            self.file_list.setUpdatesEnabled(True)
+            self.file_list.viewport().update()
         
         self._update_files_stats()
         self._update_display()
         self._update_analysis_widget()
         self._update_interpretation_widgets()
-        self.batch_widget.update_batch_results(self.images)
+        self._schedule_batch_update()
         
         self.statusBar().showMessage(f"Готово: {len(results)}")
     
@@ -2,7 +2,8 @@
 # -*- coding: utf-8 -*-
 """Workers package."""
 
+from .prefetch import ImagePrefetchTask
 from .processing import ProcessingWorker
 from .update import UpdateCheckWorker, UpdateDownloadWorker
 
-__all__ = ['ProcessingWorker', 'UpdateCheckWorker', 'UpdateDownloadWorker']
+__all__ = ['ImagePrefetchTask', 'ProcessingWorker', 'UpdateCheckWorker', 'UpdateDownloadWorker']
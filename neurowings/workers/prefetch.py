@@ -0,0 +1,33 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+NeuroWings - Фоновое декодирование соседних изображений (предзагрузка)
+"""
+
+from PyQt5.QtCore import QObject, QRunnable, pyqtSignal
+from PyQt5.QtGui import QImage
+
+
+class ImagePrefetchSignals(QObject):
+    """Сигналы ImagePrefetchTask (QRunnable сам не умеет эмитить)"""
+
+    loaded = pyqtSignal(str, object)
+
+
+class ImagePrefetchTask(QRunnable):
+    """
+    Декодирование изображения в QImage в потоке QThreadPool.
+
+    QPixmap можно создавать только в GUI-потоке, поэтому получатель
+    конвертирует QImage через QPixmap.fromImage(). При ошибке декодирования
+    эмитится пустой QImage, чтобы получатель мог снять задачу.
+    """
+
+    def __init__(self, path: str):
+        super().__init__()
+        self.setAutoDelete(False)
+        self.path = path
+        self.signals = ImagePrefetchSignals()
+
+    def run(self):
+        self.signals.loaded.emit(self.path, QImage(self.path))
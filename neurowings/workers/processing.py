@@ -14,23 +14,27 @@ import logging
 import numpy as np
 import cv2
 
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from PyQt5.QtCore import QThread, pyqtSignal
 
 from ..core.constants import (
-    YOLO_TO_WINGSDIG, YOLO_DET_IMAGE_SIZE, YOLO_DET_CONFIDENCE,
-    YOLO_POSE_IMAGE_SIZE, YOLO_POSE_CONFIDENCE, BBOX_MARGIN,
+    YOLO_TO_WINGSDIG, YOLO_DET_IMAGE_SIZE, YOLO_DET_CONFIDENCE, YOLO_DET_BATCH_SIZE,
+    YOLO_POSE_IMAGE_SIZE, YOLO_POSE_CONFIDENCE, YOLO_POSE_BATCH_SIZE, BBOX_MARGIN,
     STAGE2_CROP_SIZE, SUBPIXEL_CROP_SIZE,
     STAGE2_PORTABLE_CROP_HALF, STAGE2_PORTABLE_CROP_SIZE,
     STAGE2_PORTABLE_ITERATIONS, STAGE2_PORTABLE_MAX_OFFSET
 )
 from ..core.data_models import Wing, WingPoint, BBox
-from ..core.models import TORCH_AVAILABLE, TORCH_IMPORT_ERROR
+from ..core.models import TORCH_AVAILABLE, TORCH_IMPORT_ERROR, REFINE_MAX_BATCH
 
 logger = logging.getLogger("NeuroWings")
 
-# Ручная коррекция по Y для первых двух точек (смещение вверх в пикселях)
-KP_Y_CORRECTION = {0: -3.0, 1: -3.0}
+# Ручная коррекция по Y для первых двух точек (смещение вверх в пикселях),
+# в виде (8, 2) сдвигов по точкам для векторного прибавления
+KP_Y_OFFSETS = np.zeros((8, 2), dtype=np.float64)
+KP_Y_OFFSETS[[0, 1], 1] = -3.0
 
 if TORCH_AVAILABLE:
     import torch
@@ -38,16 +42,70 @@ if TORCH_AVAILABLE:
 
 BEST_PIPELINE = ['portable', 'portable', 'mac', 'portable', 'mac', 'mac', 'mac', 'mac']
 
+# Перестановка YOLO -> WingsDig и выбор пайплайна по точкам - индексы для NumPy
+YOLO_TO_WINGSDIG_IDX = np.array(YOLO_TO_WINGSDIG, dtype=np.int64)
+USE_PORTABLE_MASK = np.array([pipeline == 'portable' for pipeline in BEST_PIPELINE])[:, None]
+
+# Потоки чтения изображений и глубина упреждающего чтения: в памяти не больше
+# IMAGE_READ_AHEAD прочитанных заранее изображений сверх текущего батча детекции
+IMAGE_READ_WORKERS = 2
+IMAGE_READ_AHEAD = 2
+
+# Нормализация ImageNet для входа Stage2/SubPixel
+NORM_MEAN = (0.485, 0.456, 0.406)
+NORM_STD = (0.229, 0.224, 0.225)
+
+# CUDA Graphs для моделей уточнения: батч дополняется до кратного CUDA_GRAPH_BUCKET_STEP
+# (не больше REFINE_MAX_BATCH - _run_batch режет батч на части). Граф бакета захватывается
+# при первой надобности и хранится на самой модели, поэтому переживает прогоны
+USE_CUDA_GRAPHS = True
+CUDA_GRAPH_BUCKET_STEP = 16
+
+
+class CudaGraphRunner:
+    """
+    Захваченный CUDA Graph прямого прохода модели для фиксированной формы входа.
+    Вход копируется в статический буфер, граф воспроизводится одним вызовом
+    вместо запуска каждого ядра из Python.
+    """
+
+    def __init__(self, model, shape, device, use_amp, pool=None):
+        self.static_in = torch.zeros(shape, device=device).contiguous(memory_format=torch.channels_last)
+
+        # Кэш приведения весов autocast несовместим с захватом графа
+        def forward():
+            with torch.autocast(device_type='cuda', dtype=torch.float16, enabled=use_amp, cache_enabled=False):
+                return model(self.static_in)
+
+        # Прогрев в отдельном потоке: cuDNN выбирает алгоритмы до захвата
+        warmup_stream = torch.cuda.Stream(device)
+        warmup_stream.wait_stream(torch.cuda.current_stream(device))
+        with torch.cuda.stream(warmup_stream):
+            for _ in range(3):
+                forward()
+        torch.cuda.current_stream(device).wait_stream(warmup_stream)
+
+        self.graph = torch.cuda.CUDAGraph()
+        with torch.cuda.graph(self.graph, pool=pool):
+            self.static_out = forward()
+
+    def __call__(self, x):
+        n = x.shape[0]
+        self.static_in[:n].copy_(x)
+        self.graph.replay()
+        # Строки дополнения игнорируются; выход читается до следующего replay
+        return self.static_out[:n]
+
 
 class ProcessingWorker(QThread):
     """Воркер для обработки изображений в фоновом потоке"""
 
     progress = pyqtSignal(int, int, str)
-    finished = pyqtSignal(dict)
+    finished = pyqtSignal(dict)  # {path: (wings, width, height)}
     error = pyqtSignal(str)
 
     def __init__(self, image_paths, model_det, model_pose, model_stage2, device,
-                 model_subpixel=None, model_stage2_portable=None):
+                 model_subpixel=None, model_stage2_portable=None, use_fp16=True):
         super().__init__()
         self.image_paths = [Path(p) for p in image_paths]
         self.model_det = model_det
@@ -56,7 +114,22 @@ class ProcessingWorker(QThread):
         self.model_subpixel = model_subpixel
         self.model_stage2_portable = model_stage2_portable
         self.device = device
+        self.use_fp16 = use_fp16
         self._stop = False
+        self._norm_scale = None
+        self._norm_shift = None
+        self._use_amp = False
+        self._pin_memory = False
+        # Переиспользуемые буферы патчей по размеру патча: pinned на хосте и на устройстве
+        self._host_buffers = {}
+        self._device_buffers = {}
+        # На CUDA: отдельные потоки для загрузки патчей и для вычислений,
+        # буферы на устройстве двойные (чередуются между батчами)
+        self._copy_stream = None
+        self._exec_stream = None
+        self._buffer_slot = 0
+        self._use_cuda_graphs = False
+        self._cudnn_benchmark = False
 
     def run(self):
         """Основной метод обработки"""
@@ -65,268 +138,547 @@ class ProcessingWorker(QThread):
             self.error.emit(f"Нейросетевой движок недоступен: {detail}")
             return
 
+        # Константы нормализации живут на устройстве весь прогон:
+        # (x / 255 - mean) / std = x * scale - shift, один mul и один sub
+        mean = torch.tensor(NORM_MEAN, dtype=torch.float32, device=self.device).view(1, 3, 1, 1)
+        std = torch.tensor(NORM_STD, dtype=torch.float32, device=self.device).view(1, 3, 1, 1)
+        self._norm_scale = 1.0 / (255.0 * std)
+        self._norm_shift = mean / std
+
+        # FP16 через autocast только на CUDA и если не отключён (use_fp16);
+        # веса остаются FP32 (модели общие с главным окном)
+        is_cuda = getattr(self.device, 'type', None) == 'cuda'
+        self._use_amp = is_cuda and self.use_fp16
+        self._pin_memory = is_cuda
+        self._use_cuda_graphs = is_cuda and USE_CUDA_GRAPHS
+        self._cudnn_benchmark = is_cuda
+        if is_cuda:
+            self._copy_stream = torch.cuda.Stream(self.device)
+            self._exec_stream = torch.cuda.Stream(self.device)
+        for model in (self.model_stage2, self.model_subpixel, self.model_stage2_portable):
+            if isinstance(model, torch.nn.Module):
+                model.to(memory_format=torch.channels_last)
+
+        pool = ThreadPoolExecutor(max_workers=IMAGE_READ_WORKERS, thread_name_prefix="image-read")
         try:
             results = {}
-            total = len(self.image_paths)
+            paths = self.image_paths
+            total = len(paths)
+
+            reads = deque()
+            next_read = 0
+
+            def read_ahead():
+                """Дополнить очередь чтения до IMAGE_READ_AHEAD изображений"""
+                nonlocal next_read
+                while len(reads) < IMAGE_READ_AHEAD and next_read < total:
+                    reads.append((next_read, paths[next_read], pool.submit(self._read_image, paths[next_read])))
+                    next_read += 1
+
+            # Один inference_mode на весь прогон (модели переведены в eval() при загрузке)
+            with torch.inference_mode():
+                read_ahead()
+                # Прогрев идёт, пока читаются первые изображения
+                if is_cuda:
+                    self._warmup()
+                while reads and not self._stop:
+                    # Батч набирается из очереди; на место каждого взятого изображения
+                    # сразу ставится чтение следующего
+                    batch = []
+                    while reads and len(batch) < YOLO_DET_BATCH_SIZE:
+                        i, path, future = reads.popleft()
+                        read_ahead()
+                        loaded = future.result()
+                        if loaded is not None:
+                            batch.append((i, path, loaded))
+                    if not batch:
+                        continue
 
-            for i, path in enumerate(self.image_paths):
-                if self._stop:
-                    break
+                    # Детекция: несколько изображений за один вызов модели
+                    det_batch = self.model_det(
+                        [det_img for _, _, (_, _, det_img, _) in batch],
+                        imgsz=YOLO_DET_IMAGE_SIZE, conf=YOLO_DET_CONFIDENCE, verbose=False
+                    )
 
-                self.progress.emit(i + 1, total, f"Обработка: {path.name}")
+                    for k in range(len(batch)):
+                        if self._stop:
+                            break
 
-                img = cv2.imread(str(path))
-                if img is None:
-                    continue
-                h, w = img.shape[:2]
-                img_rgb = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+                        (i, path, (img, img_rgb, _, det_scale)), det = batch[k], det_batch[k]
+                        # Обработанные изображения отпускаются сразу, не в конце батча
+                        batch[k] = det_batch[k] = None
 
-                wings = []
-                det_results = self.model_det(img, imgsz=YOLO_DET_IMAGE_SIZE, conf=YOLO_DET_CONFIDENCE, verbose=False)
-
-                for det in det_results:
-                    if det.boxes is None:
-                        continue
-
-                    for box in det.boxes:
-                        x1, y1, x2, y2 = box.xyxy[0].cpu().numpy()
-                        x1, y1, x2, y2 = int(x1), int(y1), int(x2), int(y2)
-
-                        x1m, y1m = max(0, x1 - BBOX_MARGIN), max(0, y1 - BBOX_MARGIN)
-                        x2m, y2m = min(w, x2 + BBOX_MARGIN), min(h, y2 + BBOX_MARGIN)
-
-                        crop = img[y1m:y2m, x1m:x2m]
-                        crop_h, crop_w = crop.shape[:2]
-
-                        pose_results = self.model_pose(crop, imgsz=YOLO_POSE_IMAGE_SIZE, conf=YOLO_POSE_CONFIDENCE, verbose=False)
-
-                        for pose in pose_results:
-                            if pose.keypoints is None:
-                                continue
-
-                            kpts = pose.keypoints.xy.cpu().numpy()
-                            if len(kpts) == 0:
-                                continue
-
-                            for kpt in kpts:
-                                if len(kpt) != 8:
-                                    continue
-
-                                # YOLO points (relative to crop)
-                                yolo_points_crop = [(px, py) for px, py in kpt]
-
-                                # Stage1/Stage2 (MAC pipeline)
-                                if self.model_stage2 is not None:
-                                    stage1_refined = []
-                                    stage2_refined = []
-
-                                    for kp_idx, (px, py) in enumerate(yolo_points_crop):
-                                        skip_s2 = (kp_idx == 0)
-
-                                        s1x, s1y = self._refine_point_stage2_only(
-                                            crop, px, py, crop_w, crop_h, skip_stage2=skip_s2
-                                        )
-                                        if kp_idx in KP_Y_CORRECTION:
-                                            s1y += KP_Y_CORRECTION[kp_idx]
-                                        stage1_refined.append((s1x + x1m, s1y + y1m))
-
-                                        s2x, s2y = self._refine_point_full(
-                                            crop, px, py, crop_w, crop_h, skip_stage2=skip_s2
-                                        )
-                                        if kp_idx in KP_Y_CORRECTION:
-                                            s2y += KP_Y_CORRECTION[kp_idx]
-                                        stage2_refined.append((s2x + x1m, s2y + y1m))
-                                else:
-                                    stage1_refined = [(px + x1m, py + y1m) for px, py in yolo_points_crop]
-                                    stage2_refined = stage1_refined
-
-                                # Portable pipeline (Stage2 iterative, нормализованный выход)
-                                portable_refined = []
-                                if self.model_stage2_portable is not None:
-                                    for px, py in yolo_points_crop:
-                                        rx, ry = self._refine_point_portable(img_rgb, px + x1m, py + y1m, w, h)
-                                        portable_refined.append((rx, ry))
-                                else:
-                                    portable_refined = [(px + x1m, py + y1m) for px, py in yolo_points_crop]
-
-                                # Convert YOLO points to global coordinates
-                                yolo_points = [(px + x1m, py + y1m) for px, py in yolo_points_crop]
-
-                                # Перестановка точек YOLO -> WingsDig
-                                mac_wing_points = [stage2_refined[YOLO_TO_WINGSDIG[i]] for i in range(8)]
-                                mac_stage1_wing_points = [stage1_refined[YOLO_TO_WINGSDIG[i]] for i in range(8)]
-                                portable_wing_points = [portable_refined[YOLO_TO_WINGSDIG[i]] for i in range(8)]
-                                yolo_wing_points = [yolo_points[YOLO_TO_WINGSDIG[i]] for i in range(8)]
-
-                                # Комбинация: выбираем лучшую модель по KPI
-                                final_points = []
-                                for idx in range(8):
-                                    if BEST_PIPELINE[idx] == 'portable':
-                                        final_points.append(portable_wing_points[idx])
-                                    else:
-                                        final_points.append(mac_wing_points[idx])
-
-                                stage1_points = [WingPoint(x=pt[0], y=pt[1]) for pt in mac_stage1_wing_points] if self.model_stage2 else []
-
-                                wing = Wing(
-                                    points=[WingPoint(x=pt[0], y=pt[1]) for pt in final_points],
-                                    bbox=BBox(x1, y1, x2, y2),
-                                    points_yolo=[WingPoint(x=pt[0], y=pt[1]) for pt in yolo_wing_points],
-                                    points_stage1=stage1_points,
-                                    points_stage2=[WingPoint(x=pt[0], y=pt[1]) for pt in final_points],
-                                    point_sources=['stage2'] * 8
-                                )
-                                wings.append(wing)
-
-                results[str(path)] = wings
+                        self.progress.emit(i + 1, total, f"Обработка: {path.name}")
+                        h, w = img.shape[:2]
+                        # Размеры уже известны - UI не придётся декодировать файл ещё раз
+                        results[str(path)] = (self._process_image(img, img_rgb, det, det_scale), w, h)
 
+            # Кэш CUDA-аллокатора не сбрасываем (empty_cache): рабочий набор блоков
+            # одинаков от прогона к прогону и переиспользуется следующей обработкой
             self.finished.emit(results)
 
-            # Очистка GPU памяти
-            if TORCH_AVAILABLE and torch.cuda.is_available():
-                torch.cuda.empty_cache()
-                logger.debug("GPU память очищена")
-
         except Exception as e:
             import traceback
             logger.error(f"Ошибка обработки: {e}", exc_info=True)
             self.error.emit(f"{str(e)}\n{traceback.format_exc()}")
+        finally:
+            pool.shutdown(wait=False, cancel_futures=True)
 
-    def _extract_patch(self, img, cx, cy, size, w, h):
+    @staticmethod
+    def _read_image(path):
         """
-        Extract patch centered at (cx, cy).
+        Чтение изображения и уменьшение под детектор (в потоке чтения).
+        img_rgb - представление BGR-массива с обратным порядком каналов (без копии):
+        RGB нужен только патчам portable, они и копируют свои участки.
+
+        Большие изображения заранее уменьшаются до размера, к которому их привёл бы
+        letterbox Ultralytics (длинная сторона = YOLO_DET_IMAGE_SIZE, INTER_LINEAR):
+        тогда ресайз идёт параллельно с работой GPU, а не внутри вызова детектора.
 
         Returns:
-            patch: The extracted patch (resized to size x size)
-            (center_x, center_y): The actual center of the patch in image coordinates
+            (img, img_rgb, det_img, det_scale) или None;
+            det_scale - множители (sx, sy, sx, sy) от det_img к исходному изображению
         """
-        half = size // 2
+        img = cv2.imread(str(path))
+        if img is None:
+            return None
+        img_rgb = img[:, :, ::-1]
+
+        h, w = img.shape[:2]
+        r = min(YOLO_DET_IMAGE_SIZE / h, YOLO_DET_IMAGE_SIZE / w)
+        if r >= 1.0:
+            return img, img_rgb, img, None
+        new_w, new_h = int(round(w * r)), int(round(h * r))
+        det_img = cv2.resize(img, (new_w, new_h), interpolation=cv2.INTER_LINEAR)
+        sx, sy = w / new_w, h / new_h
+        return img, img_rgb, det_img, np.array([sx, sy, sx, sy])
+
+    def _process_image(self, img, img_rgb, det, det_scale=None):
+        """
+        Поза и уточнение точек для всех рамок одного изображения.
+
+        Args:
+            img: BGR изображение
+            img_rgb: то же изображение в RGB (view с обратным порядком каналов)
+            det: результат детекции YOLO для этого изображения
+            det_scale: множители рамок к исходному размеру (если детектор видел уменьшенную копию)
+
+        Returns:
+            Список Wing
+        """
+        wings = []
+        if det.boxes is None or len(det.boxes) == 0:
+            return wings
+
+        h, w = img.shape[:2]
+
+        # Кропы всех рамок - в модель позы одним вызовом
+        # Все рамки копируются на хост одним переносом (а не .cpu() на каждую)
+        boxes = []
+        crops = []
+        xyxy = det.boxes.xyxy.cpu().numpy()
+        if det_scale is not None:
+            xyxy = xyxy * det_scale
+        for x1, y1, x2, y2 in xyxy.astype(np.int64).tolist():
+            x1m, y1m = max(0, x1 - BBOX_MARGIN), max(0, y1 - BBOX_MARGIN)
+            x2m, y2m = min(w, x2 + BBOX_MARGIN), min(h, y2 + BBOX_MARGIN)
+
+            boxes.append((x1, y1, x2, y2, x1m, y1m))
+            crops.append(img[y1m:y2m, x1m:x2m])
+
+        # Не больше YOLO_POSE_BATCH_SIZE кропов за вызов - предел батча TensorRT-движка
+        pose_batch = [
+            pose
+            for start in range(0, len(crops), YOLO_POSE_BATCH_SIZE)
+            for pose in self.model_pose(
+                crops[start:start + YOLO_POSE_BATCH_SIZE],
+                imgsz=YOLO_POSE_IMAGE_SIZE, conf=YOLO_POSE_CONFIDENCE, verbose=False
+            )
+        ]
+
+        posed = [
+            (box, crop, pose.keypoints.xy)
+            for box, crop, pose in zip(boxes, crops, pose_batch)
+            if pose.keypoints is not None
+        ]
+        if not posed:
+            return wings
+
+        # Точки всех кропов - одна синхронизация device->host
+        all_kpts = torch.cat([xy for _, _, xy in posed]).cpu().numpy()
+
+        # Крылья всего изображения уточняются вместе: один батч на каждый шаг
+        wing_boxes = []
+        wing_crops = []
+        wing_kpts = []
+        offset = 0
+        for box, crop, xy in posed:
+            kpts = all_kpts[offset:offset + len(xy)]
+            offset += len(xy)
+
+            for kpt in kpts:
+                if len(kpt) != 8:
+                    continue
+                wing_boxes.append(box)
+                wing_crops.append(crop)
+                wing_kpts.append(kpt)
+        if not wing_kpts:
+            return wings
+
+        # Все наборы точек - массивы (n_wings, 8, 2) в глобальных координатах
+        kpts = np.asarray(wing_kpts, dtype=np.float64)
+        offsets = np.array([(x1m, y1m) for *_, x1m, y1m in wing_boxes], dtype=np.float64)[:, None, :]
+        yolo_xy = kpts + offsets
+
+        # Stage1/Stage2 (MAC pipeline)
+        if self.model_stage2 is not None:
+            stage1_xy, stage2_xy = self._refine_points_mac(wing_crops, kpts)
+            # Коррекция Y и перевод из координат кропа в глобальные - одним сложением
+            shift = offsets + KP_Y_OFFSETS
+            stage1_xy += shift
+            stage2_xy += shift
+        else:
+            stage1_xy = stage2_xy = yolo_xy
+
+        # Portable pipeline (Stage2 iterative, нормализованный выход)
+        if self.model_stage2_portable is not None:
+            portable_xy = self._refine_points_portable(img_rgb, yolo_xy.reshape(-1, 2), w, h).reshape(yolo_xy.shape)
+        else:
+            portable_xy = yolo_xy
+
+        # Перестановка точек YOLO -> WingsDig и выбор лучшей модели по KPI для каждой точки -
+        # сразу для всех крыльев, в списки Python переводится один раз
+        final_all = np.where(
+            USE_PORTABLE_MASK, portable_xy[:, YOLO_TO_WINGSDIG_IDX], stage2_xy[:, YOLO_TO_WINGSDIG_IDX]
+        ).tolist()
+        yolo_all = yolo_xy[:, YOLO_TO_WINGSDIG_IDX].tolist()
+        stage1_all = stage1_xy[:, YOLO_TO_WINGSDIG_IDX].tolist()
+
+        for k, (x1, y1, x2, y2, _, _) in enumerate(wing_boxes):
+            wings.append(self._build_wing(
+                BBox(x1, y1, x2, y2), yolo_all[k], stage1_all[k], final_all[k]
+            ))
+
+        return wings
+
+    def _build_wing(self, bbox, yolo_points, stage1_points, final_points):
+        """
+        Собрать Wing из уточнённых точек одного крыла.
 
-        # Calculate patch bounds
-        x1 = int(max(0, cx - half))
-        y1 = int(max(0, cy - half))
-        x2 = int(min(w, cx + half))
-        y2 = int(min(h, cy + half))
+        Args:
+            bbox: рамка крыла
+            yolo_points, stage1_points, final_points: списки [x, y] в порядке WingsDig,
+                в глобальных координатах
+        """
+        stage1_points = (
+            [WingPoint(x=x, y=y) for x, y in stage1_points]
+            if self.model_stage2 else []
+        )
+
+        return Wing(
+            points=[WingPoint(x=x, y=y) for x, y in final_points],
+            bbox=bbox,
+            points_yolo=[WingPoint(x=x, y=y) for x, y in yolo_points],
+            points_stage1=stage1_points,
+            points_stage2=[WingPoint(x=x, y=y) for x, y in final_points],
+            point_sources=['stage2'] * 8
+        )
+
+    def _extract_patches(self, images, points, size):
+        """
+        Extract patches centered at points into one preallocated batch.
+        Bounds are computed for all points at once; patches clipped by the image
+        border are zero padded at the bottom/right.
 
-        # Extract patch
-        patch = img[y1:y2, x1:x2]
+        Args:
+            images: source image of each row (list of N images, may repeat)
+            points: (N, 2) array of (cx, cy) in the coordinates of its image
 
-        # Pad if needed
-        if patch.shape[0] < size or patch.shape[1] < size:
-            padded = np.zeros((size, size, 3), dtype=np.uint8)
+        Returns:
+            patches: (N, size, size, 3) uint8 batch
+            centers: (N, 2) actual patch centers in image coordinates
+        """
+        half = size // 2
+        shapes = np.array([img.shape[:2] for img in images], dtype=np.int64).reshape(-1, 2)
+
+        # Calculate patch bounds (astype truncates like int())
+        x1 = np.maximum(0, points[:, 0] - half).astype(np.int64)
+        y1 = np.maximum(0, points[:, 1] - half).astype(np.int64)
+        x2 = np.minimum(shapes[:, 1], points[:, 0] + half).astype(np.int64)
+        y2 = np.minimum(shapes[:, 0], points[:, 1] + half).astype(np.int64)
+
+        # Interior patches fill their row completely; for border ones only the
+        # uncovered bottom/right strips are zeroed (the staging buffer is reused)
+        patches = self._staging_batch(len(points), size)
+        bounds = zip(images, x1.tolist(), y1.tolist(), x2.tolist(), y2.tolist())
+        for i, (img, px1, py1, px2, py2) in enumerate(bounds):
+            patch = img[py1:py2, px1:px2]
             ph, pw = patch.shape[:2]
-            padded[:ph, :pw] = patch
-            patch = padded
+            patches[i, :ph, :pw] = patch
+            if ph < size:
+                patches[i, ph:] = 0
+            if pw < size:
+                patches[i, :ph, pw:] = 0
 
-        # Resize to target size
-        patch = cv2.resize(patch, (size, size))
+        # Return patch centers in image coordinates
+        centers = np.stack([x1 + half, y1 + half], axis=1).astype(np.float64)
+        return patches, centers
 
-        # Return patch center in image coordinates
-        return patch, (x1 + half, y1 + half)
+    def _staging_batch(self, n, size):
+        """
+        uint8 batch (n, size, size, 3) to write patches into.
+        On CUDA it is a view of a reused pinned host buffer (grown on demand), so the
+        upload is a DMA copy without a pageable bounce; elsewhere a plain array.
+        """
+        if not self._pin_memory:
+            return np.empty((n, size, size, 3), dtype=np.uint8)
 
-    def _prepare_tensor(self, image):
+        buf = self._host_buffers.get(size)
+        if buf is None or buf.shape[0] < n:
+            buf = torch.empty((n, size, size, 3), dtype=torch.uint8).pin_memory()
+            self._host_buffers[size] = buf
+        return buf[:n].numpy()
+
+    def _upload_batch(self, patches):
         """
-        Convert an image patch to normalized NCHW tensor without torchvision.
+        Copy a uint8 patch batch to the device (into a reused buffer on CUDA).
+        On CUDA the copy is issued on the copy stream into one of two alternating
+        buffers, and the exec stream waits for it instead of the default stream.
         """
-        arr = np.ascontiguousarray(image).astype(np.float32) / 255.0
-        arr = np.transpose(arr, (2, 0, 1))
-        mean = np.array([0.485, 0.456, 0.406], dtype=np.float32)[:, None, None]
-        std = np.array([0.229, 0.224, 0.225], dtype=np.float32)[:, None, None]
-        arr = (arr - mean) / std
-        return torch.from_numpy(arr).unsqueeze(0).to(self.device)
-
-    def _refine_point_stage2_only(self, img, x, y, w, h, skip_stage2=False):
+        host = torch.from_numpy(np.ascontiguousarray(patches))
+        if not self._pin_memory:
+            return host.to(self.device)
+
+        n, size = host.shape[0], host.shape[1]
+        self._buffer_slot ^= 1
+        key = (size, self._buffer_slot)
+        buf = self._device_buffers.get(key)
+        if buf is None or buf.shape[0] < n:
+            buf = torch.empty((n, size, size, 3), dtype=torch.uint8, device=self.device)
+            self._device_buffers[key] = buf
+        with torch.cuda.stream(self._copy_stream):
+            batch = buf[:n].copy_(host, non_blocking=True)
+        self._exec_stream.wait_stream(self._copy_stream)
+        return batch
+
+    def _prepare_batch(self, patches):
         """
-        Refine point using only Stage2 model (for Stage1 display).
-        Uses new 2025 logic: direct pixel offset from patch center.
+        Convert a stack of uint8 patches (N, H, W, 3) to normalized NCHW tensor.
+        The uint8 batch is uploaded as is; scaling and normalization run on the device
+        as one multiply-subtract with the cached per-channel scale/shift tensors.
         """
-        cx, cy = x, y
+        batch = self._upload_batch(patches)
+        return batch.permute(0, 3, 1, 2).float().mul_(self._norm_scale).sub_(self._norm_shift)
 
-        if self.model_stage2 is not None and not skip_stage2:
-            patch, (patch_cx, patch_cy) = self._extract_patch(img, cx, cy, STAGE2_CROP_SIZE, w, h)
+    def _run_batch(self, model, patches):
+        """
+        Forward passes over a batch of patches instead of one call per point.
+        Large batches (many wings in one image) are split into chunks of at most
+        REFINE_MAX_BATCH rows: the TensorRT profile does not accept more, and the
+        activations of a few hundred crops would not fit in GPU memory.
 
-            with torch.no_grad():
-                inp = self._prepare_tensor(patch)
-                offset = self.model_stage2(inp)[0].cpu().numpy()
+        Returns:
+            (N, 2) numpy array of model outputs
+        """
+        if len(patches) <= REFINE_MAX_BATCH:
+            return self._run_chunk(model, patches)
+        return np.concatenate([
+            self._run_chunk(model, patches[start:start + REFINE_MAX_BATCH])
+            for start in range(0, len(patches), REFINE_MAX_BATCH)
+        ])
+
+    def _run_chunk(self, model, patches):
+        """One forward pass over at most REFINE_MAX_BATCH patches."""
+        # cudnn.benchmark - глобальный флаг: включается только на вызовы моделей уточнения
+        # (входы фиксированного размера), YOLO с переменными формами его не видит
+        prev_benchmark = torch.backends.cudnn.benchmark
+        torch.backends.cudnn.benchmark = self._cudnn_benchmark
+        try:
+            # Stage2/SubPixel не занимают поток по умолчанию (на нём работают YOLO-модели);
+            # .cpu() в конце синхронизирует exec-поток, поэтому pinned-буфер можно переиспользовать
+            with torch.cuda.stream(self._exec_stream):
+                inp = self._prepare_batch(patches).contiguous(memory_format=torch.channels_last)
+                runner = self._graph_runner(model, tuple(inp.shape))
+                if runner is not None:
+                    out = runner(inp)
+                else:
+                    with torch.autocast(device_type='cuda', dtype=torch.float16, enabled=self._use_amp):
+                        out = model(inp)
+                return out.float().cpu().numpy()
+        finally:
+            torch.backends.cudnn.benchmark = prev_benchmark
+
+    def _warmup(self):
+        """
+        One pass of each refinement model on a single-bucket batch before the first image:
+        cuDNN autotuning, ONNX Runtime/TensorRT session setup and (on the first run
+        only) the capture of that bucket's CUDA Graph happen here, not on image 1.
+        """
+        for model, size in (
+            (self.model_stage2, STAGE2_CROP_SIZE),
+            (self.model_subpixel, SUBPIXEL_CROP_SIZE),
+            (self.model_stage2_portable, STAGE2_PORTABLE_CROP_SIZE),
+        ):
+            if model is None:
+                continue
+            patches = self._staging_batch(CUDA_GRAPH_BUCKET_STEP, size)
+            patches[:] = 0
+            try:
+                self._run_batch(model, patches)
+            except Exception as e:
+                logger.warning(f"Прогрев модели не удался: {e}")
+
+    def _graph_runner(self, model, shape):
+        """
+        CUDA Graph runner for the model and input shape (batch rounded up to a multiple
+        of CUDA_GRAPH_BUCKET_STEP), captured on first use.
+        Runners are kept on the model object, so a new worker per run reuses them,
+        and all graphs of one model share a single memory pool: replays are strictly
+        sequential and each output is copied to the host before the next replay.
+        Returns None when graphs are off, the model is not a torch module or capture failed.
+        """
+        if not self._use_cuda_graphs or not isinstance(model, torch.nn.Module):
+            return None
+
+        graphs = getattr(model, '_cuda_graphs', None)
+        if graphs is None:
+            graphs = model._cuda_graphs = {'pool': torch.cuda.graph_pool_handle(), 'runners': {}}
+
+        n, channels, height, width = shape
+        bucket = -(-n // CUDA_GRAPH_BUCKET_STEP) * CUDA_GRAPH_BUCKET_STEP
+        key = (bucket, height, width, self._use_amp)
+        runners = graphs['runners']
+        if key not in runners:
+            try:
+                runners[key] = CudaGraphRunner(
+                    model, (bucket, channels, height, width), self.device, self._use_amp, graphs['pool']
+                )
+            except Exception as e:
+                logger.warning(f"CUDA Graph недоступен ({e}), используется обычный запуск")
+                runners[key] = None
+        return runners[key]
+
+    def _stage2_batch(self, images, points, rows):
+        """
+        Stage2 refinement of the selected rows of points in one batch.
+        Uses new 2025 logic: direct pixel offset from patch center.
+        """
+        refined = points.copy()
+        if len(rows) == 0:
+            return refined
 
-            # NEW LOGIC: add offset to patch center (not to cx, cy!)
-            cx = patch_cx + offset[0]
-            cy = patch_cy + offset[1]
+        patches, centers = self._extract_patches([images[r] for r in rows], points[rows], STAGE2_CROP_SIZE)
+        offsets = self._run_batch(self.model_stage2, patches)
 
-        return float(cx), float(cy)
+        # NEW LOGIC: add offset to patch center (not to cx, cy!)
+        refined[rows] = centers + offsets
+        return refined
 
-    def _refine_point_full(self, img, x, y, w, h, skip_stage2=False):
+    def _subpixel_batch(self, images, points):
         """
-        Refine point using full pipeline: Stage2 + SubPixel.
-        Uses new 2025 logic: direct pixel offset from patch center.
+        SubPixel refinement (64x64 patches) of all points in one batch.
         """
-        cx, cy = x, y
+        patches, centers = self._extract_patches(images, points, SUBPIXEL_CROP_SIZE)
+        offsets = self._run_batch(self.model_subpixel, patches)
 
-        # Stage2 refinement (256x256 patch)
-        if self.model_stage2 is not None and not skip_stage2:
-            patch, (patch_cx, patch_cy) = self._extract_patch(img, cx, cy, STAGE2_CROP_SIZE, w, h)
+        # Add offset to patch center
+        return centers + offsets
 
-            with torch.no_grad():
-                inp = self._prepare_tensor(patch)
-                offset = self.model_stage2(inp)[0].cpu().numpy()
+    def _refine_points_mac(self, crops, kpts):
+        """
+        Refine the points of all wings of an image with the MAC pipeline:
+        Stage2 + SubPixel, one batch per step for all wings together.
+        KP1 skips Stage2. The Stage2 result is also the Stage1 display set,
+        so Stage2 runs once per point.
 
-            # NEW LOGIC: add offset to patch center
-            cx = patch_cx + offset[0]
-            cy = patch_cy + offset[1]
+        Args:
+            crops: bbox crop of each wing
+            kpts: (n_wings, 8, 2) YOLO points in the coordinates of their crop
 
-        # SubPixel refinement (64x64 patch)
-        if self.model_subpixel is not None:
-            patch, (patch_cx, patch_cy) = self._extract_patch(img, cx, cy, SUBPIXEL_CROP_SIZE, w, h)
+        Returns:
+            (stage1, full): two (n_wings, 8, 2) numpy arrays in crop coordinates
+        """
+        n_kpts = kpts.shape[1]
+        points = kpts.reshape(-1, 2)
+        images = [crop for crop in crops for _ in range(n_kpts)]
 
-            with torch.no_grad():
-                inp = self._prepare_tensor(patch)
-                offset = self.model_subpixel(inp)[0].cpu().numpy()
+        # Stage2 refinement (256x256 patch)
+        if self.model_stage2 is not None:
+            rows = np.flatnonzero(np.arange(len(points)) % n_kpts != 0)
+            points = self._stage2_batch(images, points, rows)
+        stage1 = points
 
-            # Add offset to patch center
-            cx = patch_cx + offset[0]
-            cy = patch_cy + offset[1]
+        # SubPixel refinement (64x64 patch)
+        if self.model_subpixel is not None:
+            full = self._subpixel_batch(images, stage1)
+        else:
+            full = stage1.copy()
 
-        return float(cx), float(cy)
+        return stage1.reshape(kpts.shape), full.reshape(kpts.shape)
 
     def stop(self):
         """Остановить обработку"""
         self._stop = True
 
-    def _refine_point_portable(self, img_rgb, x, y, w, h):
+    def _portable_patches(self, img_rgb, cx, cy, w, h):
+        """
+        Patches for portable Stage2 centered at (int(cx), int(cy)), one (N, S, S, 3) batch.
+        Bounds and padding are computed for all points at once; only patches that
+        cross the image border go through cv2.copyMakeBorder (reflected borders).
+        """
+        ix = cx.astype(np.int64)
+        iy = cy.astype(np.int64)
+        x1 = ix - STAGE2_PORTABLE_CROP_HALF
+        y1 = iy - STAGE2_PORTABLE_CROP_HALF
+        x2 = ix + STAGE2_PORTABLE_CROP_HALF
+        y2 = iy + STAGE2_PORTABLE_CROP_HALF
+
+        pad_l, pad_t = np.maximum(0, -x1), np.maximum(0, -y1)
+        pad_r, pad_b = np.maximum(0, x2 - w), np.maximum(0, y2 - h)
+        on_border = (pad_l > 0) | (pad_t > 0) | (pad_r > 0) | (pad_b > 0)
+
+        x1c, y1c = np.maximum(0, x1), np.maximum(0, y1)
+        x2c, y2c = np.minimum(w, x2), np.minimum(h, y2)
+
+        patches = self._staging_batch(len(cx), STAGE2_PORTABLE_CROP_SIZE)
+        for i in range(len(cx)):
+            if not on_border[i]:
+                patches[i] = img_rgb[y1[i]:y2[i], x1[i]:x2[i]]
+                continue
+
+            # img_rgb - view с отрицательным шагом каналов, OpenCV нужен непрерывный срез;
+            # копируется только этот участок. Размер после паддинга всегда CROP_SIZE
+            # (см. assert в constants)
+            patches[i] = cv2.copyMakeBorder(
+                np.ascontiguousarray(img_rgb[y1c[i]:y2c[i], x1c[i]:x2c[i]]),
+                int(pad_t[i]), int(pad_b[i]), int(pad_l[i]), int(pad_r[i]), cv2.BORDER_REFLECT_101
+            )
+        return patches
+
+    def _refine_points_portable(self, img_rgb, points, w, h):
         """
         Iterative refinement using portable Stage2 (normalized offset, clamped).
+        Iterations are the outer loop; within an iteration all points go in one batch.
+
+        Args:
+            points: (N, 2) array in image coordinates
+
+        Returns:
+            (N, 2) numpy array
         """
+        points = np.asarray(points, dtype=np.float64)
         if self.model_stage2_portable is None:
-            return float(x), float(y)
+            return points
 
-        cx, cy = float(x), float(y)
+        cx = points[:, 0].copy()
+        cy = points[:, 1].copy()
         for _ in range(STAGE2_PORTABLE_ITERATIONS):
-            x1 = int(cx) - STAGE2_PORTABLE_CROP_HALF
-            y1 = int(cy) - STAGE2_PORTABLE_CROP_HALF
-            x2 = int(cx) + STAGE2_PORTABLE_CROP_HALF
-            y2 = int(cy) + STAGE2_PORTABLE_CROP_HALF
-
-            pad_l, pad_t = max(0, -x1), max(0, -y1)
-            pad_r, pad_b = max(0, x2 - w), max(0, y2 - h)
-
-            x1c, y1c = max(0, x1), max(0, y1)
-            x2c, y2c = min(w, x2), min(h, y2)
-
-            crop = img_rgb[y1c:y2c, x1c:x2c].copy()
-            if any([pad_l, pad_t, pad_r, pad_b]):
-                crop = cv2.copyMakeBorder(crop, pad_t, pad_b, pad_l, pad_r, cv2.BORDER_REFLECT_101)
-
-            if crop.shape[:2] != (STAGE2_PORTABLE_CROP_SIZE, STAGE2_PORTABLE_CROP_SIZE):
-                crop = cv2.resize(crop, (STAGE2_PORTABLE_CROP_SIZE, STAGE2_PORTABLE_CROP_SIZE))
-
-            with torch.no_grad():
-                inp = self._prepare_tensor(crop)
-                out = self.model_stage2_portable(inp).cpu().numpy()[0]
+            patches = self._portable_patches(img_rgb, cx, cy, w, h)
+            out = self._run_batch(self.model_stage2_portable, patches)
 
-            offset_x = np.clip(out[0] * STAGE2_PORTABLE_CROP_HALF, -STAGE2_PORTABLE_MAX_OFFSET, STAGE2_PORTABLE_MAX_OFFSET)
-            offset_y = np.clip(out[1] * STAGE2_PORTABLE_CROP_HALF, -STAGE2_PORTABLE_MAX_OFFSET, STAGE2_PORTABLE_MAX_OFFSET)
+            offsets = np.clip(out * STAGE2_PORTABLE_CROP_HALF, -STAGE2_PORTABLE_MAX_OFFSET, STAGE2_PORTABLE_MAX_OFFSET)
 
-            cx = np.clip(cx + offset_x, 0, w - 1)
-            cy = np.clip(cy + offset_y, 0, h - 1)
+            cx = np.clip(cx + offsets[:, 0], 0, w - 1)
+            cy = np.clip(cy + offsets[:, 1], 0, h - 1)
 
-        return float(cx), float(cy)
+        return np.stack([cx, cy], axis=1)
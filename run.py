@@ -5,7 +5,7 @@
 
 Добавлено:
 - авто-очистка __pycache__ и *.pyc/*.pyo при старте (в лог)
-- вывод структуры проекта (дерево) в лог
+- вывод структуры проекта (дерево) в лог по флагу --tree
 - вывод реальных путей загруженных модулей (откуда импортировались)
 - перехват исключений Qt-событий (чтобы приложение не закрывалось молча)
 """
@@ -97,8 +97,11 @@ def _clean_cache(base_dir: Path) -> None:
                 logger.error(f"Failed remove dir {cache_dir}: {e}")
             dirs.remove("__pycache__")
 
-    for p in base_dir.rglob("*"):
-        if p.is_file() and p.suffix in {".pyc", ".pyo"}:
+        # Одиночные .pyc/.pyo вне __pycache__ - в том же обходе
+        for name in files:
+            if not name.endswith((".pyc", ".pyo")):
+                continue
+            p = Path(root) / name
             try:
                 p.unlink()
                 removed_files += 1
@@ -110,31 +113,44 @@ def _clean_cache(base_dir: Path) -> None:
     logger.info(f"CACHE CLEAN: DONE (dirs={removed_dirs}, files={removed_files}, errors={errors})")
 
 
-def _log_tree(base_dir: Path, max_depth: int = 25) -> None:
+def _log_tree(base_dir: Path, max_depth: int = 25, max_entries: int = 500) -> None:
     logger.info("=" * 100)
-    logger.info(f"PROJECT TREE (max_depth={max_depth})")
+    logger.info(f"PROJECT TREE (max_depth={max_depth}, max_entries={max_entries})")
     logger.info(f"ROOT: {base_dir}")
     logger.info("-" * 100)
 
-    def depth(p: Path) -> int:
-        rel = p.relative_to(base_dir)
-        return 0 if rel == Path(".") else len(rel.parts)
-
-    paths = sorted(base_dir.rglob("*"), key=lambda x: (x.is_file(), str(x).lower()))
-    for p in paths:
-        d = depth(p)
-        if d > max_depth:
-            continue
-        indent = "  " * d
-        rel = p.relative_to(base_dir)
-        if p.is_dir():
-            logger.info(f"{indent}[D] {rel}/")
-        else:
-            try:
-                size = p.stat().st_size
-            except Exception:
-                size = -1
-            logger.info(f"{indent}[F] {rel} ({size} bytes)")
+    count = 0
+
+    def walk(path: Path, depth: int) -> bool:
+        """Обход одного каталога (сначала папки, затем файлы); False - лимит исчерпан"""
+        nonlocal count
+        try:
+            with os.scandir(path) as it:
+                entries = sorted(it, key=lambda e: (not e.is_dir(follow_symlinks=False), e.name.lower()))
+        except OSError as e:
+            logger.error(f"Failed list dir {path}: {e}")
+            return True
+
+        indent = "  " * depth
+        for entry in entries:
+            if count >= max_entries:
+                return False
+            count += 1
+            rel = Path(entry.path).relative_to(base_dir)
+            if entry.is_dir(follow_symlinks=False):
+                logger.info(f"{indent}[D] {rel}/")
+                if depth < max_depth and not walk(Path(entry.path), depth + 1):
+                    return False
+            else:
+                try:
+                    size = entry.stat(follow_symlinks=False).st_size
+                except OSError:
+                    size = -1
+                logger.info(f"{indent}[F] {rel} ({size} bytes)")
+        return True
+
+    if not walk(base_dir, 1):
+        logger.info(f"... (truncated at {max_entries} entries)")
 
     logger.info("=" * 100)
 
@@ -196,8 +212,10 @@ def main():
     neurowings_dir = BASE_DIR / "neurowings"
     if neurowings_dir.exists():
         _clean_cache(neurowings_dir)
-        # Логируем только структуру neurowings, не всего проекта (иначе PyTorch = часы ожидания)
-        _log_tree(neurowings_dir, max_depth=10)
+        # Дерево - только по запросу (--tree) и только neurowings, не всего проекта
+        # (иначе PyTorch = часы ожидания)
+        if "--tree" in sys.argv:
+            _log_tree(neurowings_dir, max_depth=10)
     else:
         logger.warning(f"Директория neurowings не найдена: {neurowings_dir}")
 